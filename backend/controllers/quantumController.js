@@ -1,26 +1,32 @@
-// Import child_process module to run Python scripts
-const { spawn } = require('child_process');
+// Long-lived Python workers replace the per-request `python3 simulation/main.py` spawn
+const { PythonWorkerPool } = require('../pythonWorkerPool');
+
+let pool = null;
+
+// The pool is started on first use so that requiring the controller stays cheap
+const getPool = () => {
+    if (!pool) {
+        pool = new PythonWorkerPool();
+    }
+    return pool;
+};
 
 // Controller function to run the quantum simulation
-const runSimulation = (req, res) => {
+const runSimulation = async (req, res) => {
     // Extract parameters from the request body
     const { model, errorRate, distances } = req.body;
 
-    // Spawn a child process to run the Python simulation script
-    const python = spawn('python3', ['simulation/main.py', model, errorRate, distances.join(',')]);
-
-    // Handle the output from the Python script and send it back to the client
-    python.stdout.on('data', (data) => {
-        res.json({ result: data.toString() });
-    });
-
-    // Handle any errors that occur during script execution
-    python.stderr.on('data', (data) => {
-        res.status(500).json({ error: data.toString() });
-    });
+    try {
+        // Run the simulation on a pooled Python worker and send the result back to the client
+        const result = await getPool().request('simulate', { model, errorRate, distances });
+        res.json({ result });
+    } catch (error) {
+        res.status(500).json({ error: error.message });
+    }
 };
 
 // Export the runSimulation function for use in routes
 module.exports = {
     runSimulation,
+    getPool,
 };
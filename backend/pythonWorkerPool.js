@@ -0,0 +1,239 @@
+// Pool of long-lived Python workers (simulation/worker.py) spoken to over stdio.
+// Every message is a 4-byte big-endian length followed by UTF-8 JSON, so the
+// Python interpreter and its imports are paid for once per worker, not per request.
+const { spawn } = require('child_process');
+
+// Larger length prefixes can only come from output that is not a frame (e.g. a stray print)
+const MAX_FRAME_BYTES = 64 * 1024 * 1024;
+
+class PythonWorker {
+    constructor(pool) {
+        this.pool = pool;
+        this.inFlight = new Map(); // request id -> pending request
+        this.completed = 0;
+        this.draining = false;
+        this.exited = false;
+        this.broken = false;
+        this.buffer = Buffer.alloc(0);
+
+        this.process = spawn(pool.python, [pool.script], { cwd: pool.cwd, stdio: ['pipe', 'pipe', 'pipe'] });
+        this.process.stdout.on('data', (chunk) => this.onData(chunk));
+        this.process.stderr.on('data', (data) => process.stderr.write(`[python worker ${this.process.pid}] ${data}`));
+        this.process.on('exit', (code, signal) => this.onExit(code, signal));
+        this.process.on('error', (error) => this.onExit(null, null, error));
+        this.process.stdin.on('error', () => {}); // reported through 'exit'
+    }
+
+    get load() {
+        return this.inFlight.size;
+    }
+
+    // Whether the worker can take another request right now
+    get available() {
+        return !this.exited && !this.draining && this.inFlight.size < this.pool.maxInFlight;
+    }
+
+    send(request) {
+        this.inFlight.set(request.id, request);
+        const body = Buffer.from(JSON.stringify({ id: request.id, method: request.method, params: request.params }));
+        const header = Buffer.alloc(4);
+        header.writeUInt32BE(body.length, 0);
+        this.process.stdin.write(Buffer.concat([header, body]));
+    }
+
+    // Responses may arrive split across or batched within stdout chunks
+    onData(chunk) {
+        if (this.broken) {
+            return;
+        }
+        this.buffer = Buffer.concat([this.buffer, chunk]);
+        while (this.buffer.length >= 4) {
+            const length = this.buffer.readUInt32BE(0);
+            if (length > MAX_FRAME_BYTES) {
+                this.onProtocolError(`Python worker sent an invalid frame length (${length} bytes)`);
+                return;
+            }
+            if (this.buffer.length < 4 + length) {
+                break;
+            }
+            let message;
+            try {
+                message = JSON.parse(this.buffer.subarray(4, 4 + length).toString());
+                if (message === null || typeof message !== 'object') {
+                    throw new Error('response is not an object');
+                }
+            } catch (error) {
+                this.onProtocolError(`Python worker sent an unreadable response: ${error.message}`);
+                return;
+            }
+            this.buffer = this.buffer.subarray(4 + length);
+            this.onMessage(message);
+        }
+    }
+
+    // Once stdout stops lining up with frames nothing more from this worker can be
+    // trusted: its requests fail and it is replaced like a recycled worker
+    onProtocolError(reason) {
+        this.broken = true;
+        this.buffer = Buffer.alloc(0);
+        for (const request of this.inFlight.values()) {
+            request.settle(reason);
+        }
+        this.inFlight.clear();
+        this.kill();
+    }
+
+    onMessage(message) {
+        const request = this.inFlight.get(message.id);
+        if (!request) {
+            return; // already timed out
+        }
+        this.inFlight.delete(message.id);
+        this.completed += 1;
+        if (this.completed >= this.pool.maxJobsPerWorker) {
+            this.draining = true;
+        }
+        request.settle(message.error, message.result);
+        this.pool.onWorkerIdle(this);
+    }
+
+    onExit(code, signal, error) {
+        if (this.exited) {
+            return;
+        }
+        this.exited = true;
+        const reason = error ? error.message : `Python worker exited (code ${code}, signal ${signal})`;
+        for (const request of this.inFlight.values()) {
+            request.settle(reason);
+        }
+        this.inFlight.clear();
+        this.pool.onWorkerExit(this);
+    }
+
+    // Closing stdin lets worker.py finish its loop and exit cleanly
+    stop() {
+        this.draining = true;
+        this.process.stdin.end();
+    }
+
+    kill() {
+        this.draining = true;
+        this.process.kill('SIGKILL');
+    }
+}
+
+class PythonWorkerPool {
+    constructor(options = {}) {
+        this.python = options.python || process.env.PYTHON_BIN || 'python3';
+        this.script = options.script || process.env.PYTHON_WORKER_SCRIPT || 'simulation/worker.py';
+        this.cwd = options.cwd || process.cwd();
+        this.size = options.size || Number(process.env.PYTHON_WORKERS) || 2;
+        // Requests pipelined to one worker; it answers them in order
+        this.maxInFlight = options.maxInFlight || Number(process.env.PYTHON_WORKER_MAX_IN_FLIGHT) || 1;
+        // Workers are replaced after this many requests to bound memory growth
+        this.maxJobsPerWorker = options.maxJobsPerWorker || Number(process.env.PYTHON_WORKER_MAX_JOBS) || 500;
+        this.timeoutMs = options.timeoutMs || Number(process.env.PYTHON_WORKER_TIMEOUT_MS) || 60000;
+        this.respawnDelayMs = options.respawnDelayMs || 1000;
+
+        this.nextId = 1;
+        this.queue = [];
+        this.workers = new Set();
+        this.closed = false;
+        for (let i = 0; i < this.size; i++) {
+            this.workers.add(new PythonWorker(this));
+        }
+    }
+
+    // Sends one request and resolves with the worker's result
+    request(method, params, { timeoutMs = this.timeoutMs } = {}) {
+        if (this.closed) {
+            return Promise.reject(new Error('Python worker pool is closed'));
+        }
+        return new Promise((resolve, reject) => {
+            const request = { id: this.nextId++, method, params, worker: null };
+            const timer = setTimeout(() => {
+                const queued = this.queue.indexOf(request);
+                if (queued !== -1) {
+                    this.queue.splice(queued, 1);
+                } else if (request.worker) {
+                    // A busy worker cannot be interrupted, so it is replaced
+                    request.worker.inFlight.delete(request.id);
+                    request.worker.kill();
+                }
+                request.settle(`Python worker timed out after ${timeoutMs} ms`);
+            }, timeoutMs);
+
+            let settled = false;
+            request.settle = (error, result) => {
+                if (settled) {
+                    return;
+                }
+                settled = true;
+                clearTimeout(timer);
+                if (error) {
+                    reject(new Error(error));
+                } else {
+                    resolve(result);
+                }
+            };
+
+            this.queue.push(request);
+            this.dispatch();
+        });
+    }
+
+    // Hands queued requests to the least loaded available workers
+    dispatch() {
+        while (this.queue.length > 0) {
+            let target = null;
+            for (const worker of this.workers) {
+                if (worker.available && (!target || worker.load < target.load)) {
+                    target = worker;
+                }
+            }
+            if (!target) {
+                return;
+            }
+            const request = this.queue.shift();
+            request.worker = target;
+            target.send(request);
+        }
+    }
+
+    onWorkerIdle(worker) {
+        if (worker.draining && worker.load === 0) {
+            worker.stop();
+        }
+        this.dispatch();
+    }
+
+    onWorkerExit(worker) {
+        this.workers.delete(worker);
+        if (this.closed) {
+            return;
+        }
+        // Recycled workers are replaced at once; crashed ones after a pause, so a
+        // broken Python environment does not turn into a respawn loop
+        const delay = worker.draining ? 0 : this.respawnDelayMs;
+        setTimeout(() => {
+            if (!this.closed) {
+                this.workers.add(new PythonWorker(this));
+                this.dispatch();
+            }
+        }, delay);
+    }
+
+    close() {
+        this.closed = true;
+        for (const request of this.queue.splice(0)) {
+            request.settle('Python worker pool is closed');
+        }
+        for (const worker of this.workers) {
+            worker.stop();
+        }
+    }
+}
+
+module.exports = {
+    PythonWorkerPool,
+};
@@ -1,8 +1,11 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from loop import run_workflow, fetch_stabilizer_matrix, convert_to_x_z_parts
+from loop import run_workflow, fetch_stabilizer_matrix, convert_to_x_z_parts, convert_to_json_serializable
+from jobs import get_job_queue, QueueFullError, SUCCEEDED, CANCELLED, FINISHED
 import numpy as np
 import traceback
+import json
+import time
 
 from flask import send_from_directory
 import os
@@ -15,6 +18,14 @@ import os
 app = Flask(__name__)
 CORS(app)
 
+# Size of the process pool run_workflow evaluates its candidates in
+CANDIDATE_WORKERS = int(os.environ.get("CANDIDATE_WORKERS", 2))
+
+# Seconds between keep-alive comments on idle event streams, so proxies keep them open
+STREAM_KEEPALIVE_SECONDS = 15
+# Seconds between polls of a streamed job's progress
+STREAM_POLL_SECONDS = 0.5
+
 @app.route('/optimize', methods=['POST'])
 def optimize():
     try:
@@ -27,7 +38,7 @@ def optimize():
         # z_part = np.array(data['z_part'])
         matrix = fetch_stabilizer_matrix(n, k)
         initial_x_part, initial_z_part = convert_to_x_z_parts(matrix)
-        result = run_workflow(initial_x_part, initial_z_part, n, k, d, num_iterations=25)
+        result = run_workflow(initial_x_part, initial_z_part, n, k, d, num_iterations=25, num_workers=CANDIDATE_WORKERS, stop_on_repeat=True)
         print(result)
         return jsonify(result)
     except Exception as e:
@@ -35,5 +46,92 @@ def optimize():
         print(traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
+@app.route('/optimize/jobs', methods=['POST'])
+def submit_optimize_job():
+    """Queues an optimize run and returns its job id without waiting for it."""
+    try:
+        job_id = get_job_queue().submit(request.json or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+@app.route('/optimize/jobs/<job_id>', methods=['GET'])
+def get_optimize_job(job_id):
+    """Returns the job's status, the iterations finished so far and, once done, the result."""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    return jsonify(job)
+
+@app.route('/optimize/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_optimize_job(job_id):
+    """Stops a queued or running job; a running job stops after its current iteration."""
+    status = get_job_queue().cancel(job_id)
+    if status is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    return jsonify({"job_id": job_id, "status": status})
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(convert_to_json_serializable(payload))}\n\n"
+
+@app.route('/optimize/stream', methods=['GET'])
+def optimize_stream():
+    """
+    Queues an optimization and streams its progress as Server-Sent Events.
+
+    The run goes through the job queue like /optimize/jobs, so streams share
+    its concurrency limit and a full queue is refused with 503. The stream
+    opens with a "job" event carrying the job id, sends every finished
+    iteration as an "iteration" event (the run_workflow progress event:
+    candidate error rates, strategy and best matrices) and ends with one
+    "result", "cancelled" or "error" event. Closing the connection cancels the
+    job after its current iteration.
+    """
+    job_queue = get_job_queue()
+    try:
+        job_id = job_queue.submit(request.args.to_dict())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 503
+
+    def stream():
+        finished = False
+        try:
+            yield _sse("job", {"job_id": job_id})
+            sent = 0
+            last_sent_at = time.monotonic()
+            while True:
+                job = job_queue.get(job_id)
+                if job is None:
+                    finished = True
+                    yield _sse("error", {"error": f"Job {job_id} is no longer available"})
+                    break
+                for event in job["iterations"][sent:]:
+                    sent += 1
+                    yield _sse("iteration", event)
+                    last_sent_at = time.monotonic()
+                if job["status"] in FINISHED:
+                    finished = True
+                    if job["status"] == SUCCEEDED:
+                        yield _sse("result", job["result"])
+                    elif job["status"] == CANCELLED:
+                        yield _sse("cancelled", {"job_id": job_id, "result": job["result"]})
+                    else:
+                        yield _sse("error", {"error": job["error"]})
+                    break
+                if time.monotonic() - last_sent_at >= STREAM_KEEPALIVE_SECONDS:
+                    yield ": keep-alive\n\n"
+                    last_sent_at = time.monotonic()
+                time.sleep(STREAM_POLL_SECONDS)
+        finally:
+            # Also reached when the client disconnects; nobody is left to read the run
+            if not finished:
+                job_queue.cancel(job_id)
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
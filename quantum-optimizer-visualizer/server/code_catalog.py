@@ -0,0 +1,143 @@
+import argparse
+import fcntl
+import os
+import threading
+import numpy as np
+from stabilizer_matrix import StabilizerMatrix
+from artifact_cache import atomic_write
+
+# Local copy of the codetables.de stabilizer matrices, indexed by (n, k).
+# Each entry is the bit-packed [x | z] matrix, one row per stabilizer.
+CATALOG_PATH = os.environ.get(
+    "STABILIZER_CATALOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "stabilizer_catalog.npz")
+)
+
+_catalogs = {}
+# Job worker threads look codes up concurrently
+_catalogs_lock = threading.RLock()
+
+
+def _entry_name(n, k):
+    return f"n{n}_k{k}"
+
+
+def parse_stabilizer_matrix_html(html):
+    """Returns the '[x | z]' rows of the stabilizer matrix on a codetables.de QECC page, or None."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Find the pre tag containing the stabilizer matrix
+    matrix_pre = soup.find('pre', string=lambda text: 'stabilizer matrix:' in text if text else False)
+    if not matrix_pre:
+        return None
+
+    # Extract the matrix part
+    matrix_text = matrix_pre.text.split('stabilizer matrix:')[1].strip()
+    return [row.strip() for row in matrix_text.split('\n') if '|' in row]
+
+
+def _read_catalog_file(path):
+    if not os.path.exists(path):
+        return {}
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def load_catalog(path=None):
+    """Returns the {entry name: packed rows} dict for path, reading the file on first use."""
+    path = CATALOG_PATH if path is None else path
+    with _catalogs_lock:
+        if path not in _catalogs:
+            _catalogs[path] = _read_catalog_file(path)
+        return _catalogs[path]
+
+
+def save_catalog(path=None):
+    """
+    Writes the catalog for path to disk.
+
+    Other processes may have saved entries since this one loaded the file, so
+    the file is re-read and merged (entries of this process win) under an
+    exclusive lock on path + '.lock' before it is replaced.
+    """
+    path = CATALOG_PATH if path is None else path
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with _catalogs_lock, open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        catalog = load_catalog(path)
+        entries = {**_read_catalog_file(path), **catalog}
+        atomic_write(path, lambda f: np.savez_compressed(f, **entries))
+        catalog.update(entries)
+
+
+def lookup(n, k, path=None):
+    """Returns the catalogued StabilizerMatrix for [[n, k]], or None."""
+    with _catalogs_lock:
+        packed = load_catalog(path).get(_entry_name(n, k))
+    if packed is None:
+        return None
+    bits = np.unpackbits(packed, axis=1, count=2 * n, bitorder='little')
+    return StabilizerMatrix.from_parts(bits[:, :n], bits[:, n:])
+
+
+def add(matrix, n=None, k=None, path=None, save=True):
+    """
+    Adds a stabilizer matrix to the catalog and returns its (n, k).
+
+    n and k default to the values implied by the matrix itself: n qubits and
+    n - rows logical qubits.
+    """
+    n = matrix.num_qubits if n is None else n
+    k = matrix.num_qubits - matrix.num_rows if k is None else k
+    if matrix.num_qubits != n:
+        raise ValueError(f"Matrix acts on {matrix.num_qubits} qubits, expected n={n}")
+    packed = np.packbits(np.hstack(matrix.parts()), axis=1, bitorder='little')
+    with _catalogs_lock:
+        load_catalog(path)[_entry_name(n, k)] = packed
+    if save:
+        save_catalog(path)
+    return n, k
+
+
+def import_html_pages(paths, path=None):
+    """Parses saved codetables.de pages in bulk and adds every valid matrix; returns the imported (n, k)."""
+    imported = []
+    for page_path in paths:
+        with open(page_path, 'rb') as f:
+            rows = parse_stabilizer_matrix_html(f.read())
+        if not rows:
+            print(f"Skipping {page_path}: no stabilizer matrix found")
+            continue
+        matrix = StabilizerMatrix.from_text(rows)
+        try:
+            matrix.validate()
+        except ValueError as e:
+            print(f"Skipping {page_path}: {e}")
+            continue
+        imported.append(add(matrix, path=path, save=False))
+    if imported:
+        save_catalog(path)
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local stabilizer matrix catalog.")
+    parser.add_argument("--catalog", default=None, help=f"catalog file (default {CATALOG_PATH})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="import saved codetables.de HTML pages")
+    import_parser.add_argument("pages", nargs="+")
+    subparsers.add_parser("list", help="list catalogued codes")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        imported = import_html_pages(args.pages, path=args.catalog)
+        print(f"Imported {len(imported)} of {len(args.pages)} pages")
+    else:
+        for name in sorted(load_catalog(args.catalog)):
+            print(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,33 @@
 from qiskit import QuantumCircuit
-import matplotlib.pyplot as plt
 import stim
-import random
-from collections import defaultdict
-
-# Dictionary to map Qiskit gates to Stim gates
-gate_mapping = {
-   'h': 'H',  # Hadamard
-   'x': 'X',  # Pauli-X
-   'z': 'Z',  # Pauli-Z
-   'cx': 'CNOT',  # CNOT
-   'cz': 'CZ',  # CZ
-   'measure': 'M'  # Measurement
-}
+import numpy as np
+from stabilizer_matrix import StabilizerMatrix
+from stim_conversion import qiskit_to_stim_circuit
+
 
     
 def generate_qiskit_circuit(x_part, z_part):
-   rows = len(x_part)
-   cols = len(x_part[0])
+   matrix = x_part if isinstance(x_part, StabilizerMatrix) else StabilizerMatrix.from_parts(x_part, z_part)
+   rows, cols = matrix.shape
    n_qubits = rows + cols
    n_classical_bits = rows
+   x_bits, z_bits = matrix.parts()
 
    qc = QuantumCircuit(n_qubits, n_classical_bits)
 
    for row in range(rows):
        qc.h(row)
 
-   for row in range(rows):
-       for col in range(cols):
-           row_qubit = row
-           col_qubit = rows + col
-           if x_part[row][col] == 1 and z_part[row][col] == 0:
-               qc.cx(row_qubit, col_qubit)
-           elif x_part[row][col] == 0 and z_part[row][col] == 1:
-               qc.cz(row_qubit, col_qubit)
-           elif x_part[row][col] == 1 and z_part[row][col] == 1:
-               qc.cy(row_qubit, col_qubit)
+   # Gates are placed in row-major order over the support of the stabilizers
+   for row, col in zip(*np.nonzero(x_bits | z_bits)):
+       row_qubit = int(row)
+       col_qubit = rows + int(col)
+       if x_bits[row, col] and not z_bits[row, col]:
+           qc.cx(row_qubit, col_qubit)
+       elif z_bits[row, col] and not x_bits[row, col]:
+           qc.cz(row_qubit, col_qubit)
+       else:
+           qc.cy(row_qubit, col_qubit)
 
    for row in range(rows):
        qc.h(row)
@@ -45,96 +37,183 @@ def generate_qiskit_circuit(x_part, z_part):
 
    return qc
 
-def advanced_gate_balancing(circuit):
-   """Performs advanced gate balancing by merging gates, reordering qubits, and maximizing parallelism."""
+# Gates equal to their own inverse, and pairs of gates inverse to each other
+inverse_gates = {'h': 'h', 'x': 'x', 'y': 'y', 'z': 'z', 'cx': 'cx', 'cy': 'cy', 'cz': 'cz', 'swap': 'swap',
+                 's': 'sdg', 'sdg': 's', 't': 'tdg', 'tdg': 't'}
+# Gates diagonal in the computational basis on every qubit they act on
+diagonal_gates = {'z', 's', 'sdg', 't', 'tdg', 'cz'}
+symmetric_gates = {'cz', 'swap'}
+
+def _is_diagonal_on(name, position):
+   """Whether a gate is diagonal on its qubit at position; CX and CY are diagonal on their control."""
+   return name in diagonal_gates or (name in ('cx', 'cy') and position == 0)
+
+def peephole_optimize(instructions, circuit):
+   """
+   Removes pairs of mutually inverse gates (H-H, CX-CX, CZ-CZ, S-Sdg, ...) and returns the remaining instructions.
+
+   Each qubit keeps a stack of its live gates and a table of the trailing run
+   of gates diagonal on it. A gate cancels against its inverse when that
+   inverse is the last live gate on every qubit where the gate is not
+   diagonal, and sits in the diagonal run on every qubit where it is, since
+   diagonal gates commute with each other. Cancellations cascade (H X X H
+   disappears entirely) and every gate is pushed and popped at most once, so
+   the pass takes linear time.
+   """
+   qubit_index = {bit: i for i, bit in enumerate(circuit.qubits)}
+   stacks = [[] for _ in range(circuit.num_qubits)]  # live gates on each qubit, oldest first
+   diagonal_runs = [dict() for _ in range(circuit.num_qubits)]  # (name, qubits) -> gate, for the trailing diagonal run
+   kept = []
+   keys = []
+   removed = []
+
+   for instruction in instructions:
+      name = instruction.operation.name
+      qubits = tuple(qubit_index[bit] for bit in instruction.qubits)
+      cancellable = (
+          name in inverse_gates and not instruction.clbits
+          and getattr(instruction.operation, 'condition', None) is None
+      )
+
+      if cancellable:
+         inverse_qubits = tuple(sorted(qubits)) if name in symmetric_gates else qubits
+         inverse_key = (inverse_gates[name], inverse_qubits)
+         partners = set()
+         for position, qubit in enumerate(qubits):
+            if _is_diagonal_on(name, position):
+               partners.add(diagonal_runs[qubit].get(inverse_key))
+            else:
+               stack = stacks[qubit]
+               while stack and removed[stack[-1]]:
+                  stack.pop()
+               partners.add(stack[-1] if stack and keys[stack[-1]] == inverse_key else None)
+         partner = partners.pop() if len(partners) == 1 else None
+         if partner is not None:
+            removed[partner] = True
+            for qubit in qubits:
+               diagonal_runs[qubit].pop(inverse_key, None)
+            continue
+
+      index = len(kept)
+      kept.append(instruction)
+      removed.append(False)
+      key = (name, tuple(sorted(qubits)) if name in symmetric_gates else qubits)
+      keys.append(key if cancellable else None)
+      for position, qubit in enumerate(qubits):
+         stacks[qubit].append(index)
+         if cancellable and _is_diagonal_on(name, position):
+            diagonal_runs[qubit][key] = index
+         else:
+            diagonal_runs[qubit].clear()
+
+   return [instruction for instruction, is_removed in zip(kept, removed) if not is_removed]
+
+def _first_free_layer(next_free, layer):
+   """Smallest layer >= layer missing from the wire's occupancy table, with path compression."""
+   path = []
+   while layer in next_free:
+       path.append(layer)
+       layer = next_free[layer]
+   for visited in path:
+       next_free[visited] = layer
+   return layer
+
+def schedule_asap(instructions, circuit):
+   """
+   Assigns every instruction to its earliest legal layer and returns (layers, stats).
+
+   Each wire (qubit or classical bit) keeps a frontier: the layer after its
+   last gate. A gate normally goes to the maximum frontier over its wires.
+   CX, CZ and CY gates sharing a control commute with each other, so within
+   such a run the control may also fill an earlier free layer; only the
+   target's frontier and the control's last non-commuting gate bound it.
+   Occupied layers of each control are kept in a next-free table, so
+   scheduling takes amortized constant time per gate.
+   """
+   wire_index = {bit: i for i, bit in enumerate(circuit.qubits)}
+   wire_index.update({bit: circuit.num_qubits + i for i, bit in enumerate(circuit.clbits)})
+   num_wires = circuit.num_qubits + circuit.num_clbits
+   frontier = [0] * num_wires  # layer after the last gate on the wire
+   barrier = [0] * num_wires   # layer after the last gate that does not commute with a controlled-Pauli run
+   next_free = [dict() for _ in range(num_wires)]
+
+   layers = []
+   for instruction in instructions:
+      wires = [wire_index[bit] for bit in instruction.qubits] + [wire_index[bit] for bit in instruction.clbits]
+      if instruction.operation.name in ('cx', 'cz', 'cy') and not instruction.clbits:
+         control, target = wires
+         layer = _first_free_layer(next_free[control], max(barrier[control], frontier[target]))
+         frontier[control] = max(frontier[control], layer + 1)
+         frontier[target] = barrier[target] = layer + 1
+         occupied = [control, target]
+      else:
+         layer = max((frontier[wire] for wire in wires), default=0)
+         for wire in wires:
+             frontier[wire] = barrier[wire] = layer + 1
+         occupied = wires
+      for wire in occupied:
+         next_free[wire][layer] = layer + 1
+
+      while len(layers) <= layer:
+         layers.append([])
+      layers[layer].append(instruction)
+
+   widths = [len(layer) for layer in layers]
+   stats = {
+       "num_gates": len(instructions),
+       "num_layers": len(layers),
+       "max_layer_width": max(widths, default=0),
+       "mean_layer_width": len(instructions) / len(layers) if layers else 0.0,
+   }
+   return layers, stats
+
+def advanced_gate_balancing(circuit, return_stats=False):
+   """
+   Performs advanced gate balancing by merging gates and re-layering the circuit for maximum parallelism.
+
+   Returns the balanced circuit, or (circuit, layer statistics) with return_stats=True.
+   """
    balanced_circuit = QuantumCircuit(circuit.num_qubits, circuit.num_clbits)
-   gate_usage = defaultdict(int)
-
-   # Step 1: Gate Merging and Commutation
-   merged_circuit_data = []
-   previous_gate = None
-   for instruction in circuit.data:
-       gate = instruction.operation
-       qubits = instruction.qubits
-
-       # Check if the current gate can be merged with the previous gate (e.g., two consecutive CNOTs)
-       if previous_gate and previous_gate.operation == gate:
-           continue  # Skip redundant gate
-       merged_circuit_data.append(instruction)
-       previous_gate = instruction
-
-   # Step 2: Optimize qubit Reordering for Parallelism
-   parallel_schedule = defaultdict(list)  # Track which qubits are used at each time step
-   for instruction in merged_circuit_data:
-       gate = instruction.operation
-       qargs = instruction.qubits
-       clbits = instruction.clbits
-
-       qubits = [q._index for q in qargs]  # Get the qubit indices
-
-       # Try to fit the gate into an available depth level, maximizing parallelism
-       added_to_level = False
-       for depth, gates in parallel_schedule.items():
-           if not any(q in gates for q in qubits):  # No overlapping qubits
-               parallel_schedule[depth].extend(qubits)  # Add qubits to that depth level
-               if gate.name == 'measure':
-                   balanced_circuit.append(gate, qargs, clbits)
-               else:
-                   balanced_circuit.append(gate, qargs)
-               added_to_level = True
-               break
-
-       if not added_to_level:  # If no suitable parallel depth was found, add to a new depth level
-           new_depth = len(parallel_schedule)
-           parallel_schedule[new_depth].extend(qubits)
-           if gate.name == 'measure':
-               balanced_circuit.append(gate, qargs, clbits)
-           else:
-               balanced_circuit.append(gate, qargs)
 
-   return balanced_circuit
+   # Step 1: Cancel self-inverse gate pairs, commuting diagonal gates past each other
+   merged_circuit_data = peephole_optimize(circuit.data, circuit)
 
-def qiskit_to_stim(qc, title="Stim Circuit"):
-   stim_circuit = []
-   for instruction in qc.data:
-       gate = instruction.operation.name
-       qubits = instruction.qubits
-       stim_gate = gate_mapping.get(gate.lower(), None)
+   # Step 2: Re-layer the circuit as soon as possible
+   layers, stats = schedule_asap(merged_circuit_data, circuit)
+   for layer in layers:
+       for instruction in layer:
+           balanced_circuit.append(instruction.operation, instruction.qubits, instruction.clbits)
 
-       if stim_gate:
-           qubit_indices = [q._index for q in qubits]
-           if len(qubit_indices) == 1:
-               stim_circuit.append(f"{stim_gate} {qubit_indices[0]}")
-           elif len(qubit_indices) > 1:
-               stim_circuit.append(f"{stim_gate} {' '.join(map(str, qubit_indices))}")
+   if return_stats:
+       stats["num_cancelled"] = len(circuit.data) - len(merged_circuit_data)
+       return balanced_circuit, stats
+   return balanced_circuit
 
-   print(f"\n{title}:\n", "\n".join(stim_circuit), "\n")
-   return "\n".join(stim_circuit)
+def qiskit_to_stim(qc):
+   """Converts a Qiskit circuit into a stim.Circuit, one instruction per run of same-type gates."""
+   return qiskit_to_stim_circuit(qc)
 
-def run_stim_simulation(string_circuit):
-   circuit = stim.Circuit(string_circuit)
-   simulator = stim.TableauSimulator()
-   simulator.do(circuit)
+def run_stim_simulation(string_circuit, num_shots=100, readout_error=0.01, seed=None):
+   """
+   Runs the circuit num_shots times and measures every qubit at the end.
 
+   All shots come from one bit-packed call of a compiled sampler; readout
+   noise flips each final measurement with probability readout_error through
+   stim's M(p). Returns a (num_shots, num_qubits) uint8 array.
+   """
+   circuit = string_circuit.copy() if isinstance(string_circuit, stim.Circuit) else stim.Circuit(string_circuit)
    num_qubits = circuit.num_qubits
-   num_shots = 100
-   samples = []
-   for _ in range(num_shots):
-       single_sample = [simulator.measure(qubit) for qubit in range(num_qubits)]
-       samples.append(single_sample)
-
-   noisy_samples = []
-   for sample in samples:
-       noisy_sample = [1 - bit if random.uniform(0, 1) < 0.01 else bit for bit in sample]
-       noisy_samples.append(noisy_sample)
-
-   # Print samples vertically
-   print("\nSimulation Results (Noisy Samples):")
-   for sample in noisy_samples:
-       print(sample)
-   print("-" * 40)
+   num_measurements = circuit.num_measurements + num_qubits
+   circuit.append("M", range(num_qubits), readout_error)
+
+   packed = circuit.compile_sampler(seed=seed).sample(num_shots, bit_packed=True)
+   samples = np.unpackbits(packed, axis=1, count=num_measurements, bitorder='little')
+   return samples[:, -num_qubits:]
 
 def visualize_circuits(original_qc, balanced_qc):
+   # Optional dependency, only needed for plotting
+   import matplotlib.pyplot as plt
+
    fig, axs = plt.subplots(2, 1, figsize=(10, 12))
 
    # Draw original circuit
@@ -169,14 +248,18 @@ if __name__ == "__main__":
 
    # Convert to stim and print the initial circuit
    print("Before Gate Balancing:")
-   stim_circuit_string = qiskit_to_stim(original_qc, title="Stim Circuit Before Gate Balancing")
+   stim_circuit = qiskit_to_stim(original_qc)
+   print(f"\nStim Circuit Before Gate Balancing:\n{stim_circuit}\n")
 
    balanced_qc = advanced_gate_balancing(original_qc)
 
    print("After Gate Balancing:")
-   stim_circuit_string_balanced = qiskit_to_stim(balanced_qc, title="Stim Circuit After Gate Balancing")
+   stim_circuit_balanced = qiskit_to_stim(balanced_qc)
+   print(f"\nStim Circuit After Gate Balancing:\n{stim_circuit_balanced}\n")
 
-   run_stim_simulation(stim_circuit_string_balanced)
+   samples = run_stim_simulation(stim_circuit_balanced)
+   print("\nSimulation Results (fraction of shots measuring 1 per qubit):")
+   print(samples.mean(axis=0))
 
    # Visialize both circuits
    visualize_circuits(original_qc, balanced_qc)
@@ -0,0 +1,439 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# "memory" keeps jobs in this process; "sqlite" shares them through a sqlite
+# database so several server processes (and standalone workers) can serve
+# the same jobs.
+JOB_BACKEND = os.environ.get("JOB_BACKEND", "memory")
+# Number of jobs run at the same time by each process
+JOB_CONCURRENCY = int(os.environ.get("JOB_CONCURRENCY", 2))
+# Maximum number of queued (not yet running) jobs before submissions are refused
+JOB_QUEUE_DEPTH = int(os.environ.get("JOB_QUEUE_DEPTH", 16))
+# Finished jobs kept in memory by the in-process queue
+JOB_HISTORY_SIZE = int(os.environ.get("JOB_HISTORY_SIZE", 256))
+JOB_DB_PATH = os.environ.get(
+    "JOB_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.sqlite3")
+)
+# Whether the server process runs sqlite jobs itself or leaves them to `python jobs.py`
+JOB_START_WORKERS = os.environ.get("JOB_START_WORKERS", "1") != "0"
+# Seconds a running sqlite job may go without a heartbeat before another worker requeues it
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", 60))
+# Upper bound on num_iterations accepted from a submission
+JOB_MAX_ITERATIONS = int(os.environ.get("JOB_MAX_ITERATIONS", 100))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+def _as_int(value, name):
+    # bool is an int, and a fractional float would be silently truncated by int()
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"{name} must be an integer")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer") from None
+
+
+def validate_params(params):
+    """
+    Returns the optimize parameters {"n", "k", "d"[, "num_iterations"]} as
+    integers, raising ValueError for a missing, non-integer or out of range value.
+    """
+    if not isinstance(params, dict):
+        raise ValueError("Job parameters must be an object")
+    missing = [key for key in ('n', 'k', 'd') if key not in params]
+    if missing:
+        raise ValueError(f"Missing parameters: {', '.join(missing)}")
+    validated = {key: _as_int(params[key], key) for key in ('n', 'k', 'd', 'num_iterations') if key in params}
+    if validated["n"] < 1:
+        raise ValueError("n must be at least 1")
+    if not 0 <= validated["k"] < validated["n"]:
+        raise ValueError("k must satisfy 0 <= k < n")
+    if validated["d"] < 1:
+        raise ValueError("d must be at least 1")
+    if not 1 <= validated.get("num_iterations", 1) <= JOB_MAX_ITERATIONS:
+        raise ValueError(f"num_iterations must be between 1 and {JOB_MAX_ITERATIONS}")
+    return validated
+
+
+def run_optimize_job(params, on_iteration=None):
+    """
+    Runs the /optimize workflow for params {"n", "k", "d"} and returns its JSON
+    result. on_iteration receives each iteration event in JSON form and stops
+    the workflow by returning False.
+    """
+    from loop import run_workflow, fetch_stabilizer_matrix, convert_to_x_z_parts, convert_to_json_serializable
+
+    n, k, d = int(params["n"]), int(params["k"]), int(params["d"])
+    matrix = fetch_stabilizer_matrix(n, k)
+    initial_x_part, initial_z_part = convert_to_x_z_parts(matrix)
+    return run_workflow(
+        initial_x_part, initial_z_part, n, k, d,
+        num_iterations=int(params.get("num_iterations", 25)),
+        num_workers=int(os.environ.get("CANDIDATE_WORKERS", 2)),
+        stop_on_repeat=True,
+        on_iteration=None if on_iteration is None else lambda event: on_iteration(convert_to_json_serializable(event))
+    )
+
+
+def _error_rate_for_json(error_rate):
+    # Rejected iterations score inf, which JSON cannot represent
+    return error_rate if error_rate != float('inf') else None
+
+
+class InProcessJobQueue:
+    """Runs jobs on a bounded thread pool and keeps their state in memory."""
+
+    def __init__(self, concurrency=JOB_CONCURRENCY, max_queued=JOB_QUEUE_DEPTH, history_size=JOB_HISTORY_SIZE, target=run_optimize_job):
+        self.max_queued = max_queued
+        self.history_size = history_size
+        self.target = target
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="job")
+
+    def submit(self, params):
+        params = validate_params(params)
+        with self._lock:
+            num_queued = sum(job["status"] == QUEUED for job in self._jobs.values())
+            if num_queued >= self.max_queued:
+                raise QueueFullError(f"Job queue is full ({num_queued} jobs waiting)")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "status": QUEUED,
+                "params": params,
+                "error_rates": [],
+                "iterations": [],
+                "cancel_requested": False,
+                "result": None,
+                "error": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+            }
+            self._evict_finished()
+        self._executor.submit(self._run, job_id, params)
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else {**job, "error_rates": list(job["error_rates"]), "iterations": list(job["iterations"])}
+
+    def cancel(self, job_id):
+        """
+        Asks a job to stop and returns its status, or None for an unknown job.
+
+        A queued job is cancelled at once; a running one stops after its current
+        iteration and keeps the partial result.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] not in FINISHED:
+                job["cancel_requested"] = True
+                if job["status"] == QUEUED:
+                    job.update(status=CANCELLED, finished_at=time.time())
+            return job["status"]
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _record_iteration(self, job_id, event):
+        # Returning False stops the workflow once the job is cancelled
+        with self._lock:
+            job = self._jobs[job_id]
+            job["error_rates"].append(_error_rate_for_json(event["error_rate"]))
+            job["iterations"].append(event)
+            return not job["cancel_requested"]
+
+    def _run(self, job_id, params):
+        with self._lock:
+            job = self._jobs[job_id]
+            if job["status"] == CANCELLED:
+                return
+            job.update(status=RUNNING, started_at=time.time())
+        try:
+            result = self.target(params, on_iteration=lambda event: self._record_iteration(job_id, event))
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            print(traceback.format_exc())
+            self._update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+        else:
+            with self._lock:
+                job = self._jobs[job_id]
+                job.update(status=CANCELLED if job["cancel_requested"] else SUCCEEDED, result=result, finished_at=time.time())
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[job_id]
+
+
+class SqliteJobQueue:
+    """
+    Job queue stored in a sqlite database, standing in for an external broker.
+
+    Every process opening the same database sees the same jobs. Worker threads
+    claim queued jobs inside an IMMEDIATE transaction, so each job runs once
+    even with several server or worker processes polling the table.
+
+    A claim is a lease: the worker refreshes heartbeat_at while the job runs,
+    and a running job whose heartbeat is older than lease_seconds (its worker
+    crashed or was killed) is put back in the queue by the next claim. Writes
+    are tied to the claim's lease id, so a worker that lost its lease stops
+    after its current iteration without overwriting the new run.
+    """
+
+    def __init__(self, path=JOB_DB_PATH, concurrency=JOB_CONCURRENCY, max_queued=JOB_QUEUE_DEPTH, start_workers=JOB_START_WORKERS, poll_interval=0.5, lease_seconds=JOB_LEASE_SECONDS, target=run_optimize_job):
+        self.path = path
+        self.max_queued = max_queued
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.target = target
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    error_rates TEXT NOT NULL DEFAULT '[]',
+                    iterations TEXT NOT NULL DEFAULT '[]',
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    lease TEXT,
+                    heartbeat_at REAL
+                )
+            """)
+            # Databases created by earlier versions lack the newer columns
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, definition in (
+                ("lease", "TEXT"),
+                ("heartbeat_at", "REAL"),
+                ("iterations", "TEXT NOT NULL DEFAULT '[]'"),
+                ("cancel_requested", "INTEGER NOT NULL DEFAULT 0"),
+            ):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        finally:
+            conn.close()
+        if start_workers:
+            for _ in range(concurrency):
+                threading.Thread(target=self.work, daemon=True).start()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def submit(self, params):
+        params = validate_params(params)
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            num_queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+            if num_queued >= self.max_queued:
+                conn.execute("ROLLBACK")
+                raise QueueFullError(f"Job queue is full ({num_queued} jobs waiting)")
+            conn.execute(
+                "INSERT INTO jobs (id, status, params, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(params), time.time())
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return job_id
+
+    def get(self, job_id):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT id, status, params, error_rates, iterations, cancel_requested, result, error, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "status": row[1],
+            "params": json.loads(row[2]),
+            "error_rates": json.loads(row[3]),
+            "iterations": json.loads(row[4]),
+            "cancel_requested": bool(row[5]),
+            "result": json.loads(row[6]) if row[6] is not None else None,
+            "error": row[7],
+            "created_at": row[8],
+            "started_at": row[9],
+            "finished_at": row[10],
+        }
+
+    def cancel(self, job_id):
+        """Same as InProcessJobQueue.cancel; the worker running the job sees the request at its next iteration."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            status = row[0]
+            if status == QUEUED:
+                status = CANCELLED
+                conn.execute(
+                    "UPDATE jobs SET cancel_requested = 1, status = ?, finished_at = ? WHERE id = ?",
+                    (CANCELLED, time.time(), job_id)
+                )
+            elif status not in FINISHED:
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return status
+
+    def _claim(self, conn):
+        """Requeues expired leases, then marks the oldest queued job as running and returns (job_id, params, lease), or None."""
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "UPDATE jobs SET status = CASE WHEN cancel_requested THEN ? ELSE ? END, lease = NULL, started_at = NULL, "
+            "error_rates = '[]', iterations = '[]' WHERE status = ? AND COALESCE(heartbeat_at, started_at) < ?",
+            (CANCELLED, QUEUED, RUNNING, now - self.lease_seconds)
+        )
+        row = conn.execute(
+            "SELECT id, params FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        lease = uuid.uuid4().hex
+        conn.execute(
+            "UPDATE jobs SET status = ?, started_at = ?, lease = ?, heartbeat_at = ? WHERE id = ?",
+            (RUNNING, now, lease, now, row[0])
+        )
+        conn.execute("COMMIT")
+        return row[0], json.loads(row[1]), lease
+
+    def _record_iteration(self, conn, job_id, lease, event):
+        # Returning False stops the workflow once the job is cancelled or another worker has taken it over
+        row = conn.execute(
+            "UPDATE jobs SET error_rates = json_insert(error_rates, '$[#]', json(?)), iterations = json_insert(iterations, '$[#]', json(?)), "
+            "heartbeat_at = ? WHERE id = ? AND lease = ? RETURNING cancel_requested",
+            (json.dumps(_error_rate_for_json(event["error_rate"])), json.dumps(event), time.time(), job_id, lease)
+        ).fetchone()
+        return row is not None and not row[0]
+
+    def _heartbeat(self, job_id, lease, done):
+        """Refreshes the job's lease until done is set; iterations can outlast the lease on their own."""
+        conn = self._connect()
+        try:
+            while not done.wait(self.lease_seconds / 3):
+                try:
+                    conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND lease = ?", (time.time(), job_id, lease))
+                except sqlite3.Error as e:
+                    print(f"Heartbeat for job {job_id} failed: {e}")
+        finally:
+            conn.close()
+
+    def _run_claimed(self, conn, job_id, params, lease):
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, lease, done), daemon=True).start()
+        try:
+            result = self.target(params, on_iteration=lambda event: self._record_iteration(conn, job_id, lease, event))
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            print(traceback.format_exc())
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND lease = ?",
+                (FAILED, str(e), time.time(), job_id, lease)
+            )
+        else:
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN cancel_requested THEN ? ELSE ? END, result = ?, finished_at = ? WHERE id = ? AND lease = ?",
+                (CANCELLED, SUCCEEDED, json.dumps(result), time.time(), job_id, lease)
+            )
+        finally:
+            done.set()
+
+    def work(self):
+        """Worker loop: claims and runs queued jobs until the process exits."""
+        conn = None
+        while True:
+            try:
+                if conn is None:
+                    conn = self._connect()
+                claimed = self._claim(conn)
+                if claimed is None:
+                    time.sleep(self.poll_interval)
+                    continue
+                self._run_claimed(conn, *claimed)
+            except Exception as e:
+                # A locked or unavailable database must not end the worker thread; a job
+                # it could not finish is requeued once its lease expires
+                print(f"Job worker error: {e}")
+                print(traceback.format_exc())
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                time.sleep(self.poll_interval)
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Returns the process-wide job queue for JOB_BACKEND, creating it on first use."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            if JOB_BACKEND == "memory":
+                _job_queue = InProcessJobQueue()
+            elif JOB_BACKEND == "sqlite":
+                _job_queue = SqliteJobQueue()
+            else:
+                raise ValueError(f"Unknown JOB_BACKEND {JOB_BACKEND!r}")
+        return _job_queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run optimize jobs from the sqlite job queue.")
+    parser.add_argument("--db", default=JOB_DB_PATH)
+    parser.add_argument("--concurrency", type=int, default=JOB_CONCURRENCY)
+    args = parser.parse_args()
+
+    queue = SqliteJobQueue(args.db, concurrency=args.concurrency, start_workers=False)
+    threads = [threading.Thread(target=queue.work, daemon=True) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    print(f"Running {args.concurrency} job workers on {args.db}")
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
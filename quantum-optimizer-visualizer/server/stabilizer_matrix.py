@@ -0,0 +1,191 @@
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+import stim
+import gf2
+
+# Pauli letter for each (x, z) bit pair, indexed by x + 2 * z
+_PAULI_LETTERS = np.frombuffer(b'IXZY', dtype=np.uint8)
+
+
+# Logical operators already derived, keyed by StabilizerMatrix.content_hash()
+LOGICAL_CACHE_SIZE = 256
+_logical_cache = OrderedDict()
+# Concurrent jobs in one process derive logicals from several threads
+_logical_cache_lock = threading.Lock()
+
+
+class StabilizerMatrix:
+    """
+    Symplectic stabilizer matrix [x | z] with both halves stored as packed uint64 bitsets.
+
+    Row i is the stabilizer whose Pauli on qubit j is I, X, Z or Y for
+    (x, z) = (0, 0), (1, 0), (0, 1) or (1, 1). Instances are immutable, hashable
+    and compare by content, so they can be used directly as cache keys.
+    """
+
+    def __init__(self, x_words, z_words, num_qubits):
+        if x_words.shape != z_words.shape:
+            raise ValueError("x and z bitsets must have the same shape")
+        self.x_words = np.ascontiguousarray(x_words, dtype='<u8')
+        self.z_words = np.ascontiguousarray(z_words, dtype='<u8')
+        self.x_words.setflags(write=False)
+        self.z_words.setflags(write=False)
+        self.num_qubits = num_qubits
+        self._digest = None
+
+    @classmethod
+    def from_parts(cls, x_part, z_part):
+        x_part = np.atleast_2d(np.asarray(x_part))
+        z_part = np.atleast_2d(np.asarray(z_part))
+        if x_part.shape != z_part.shape:
+            raise ValueError("x_part and z_part matrices must have the same shape")
+        return cls(gf2.pack_rows(x_part), gf2.pack_rows(z_part), x_part.shape[1])
+
+    @classmethod
+    def from_pauli_strings(cls, stabilizers):
+        """Builds the matrix from strings over 'IXYZ' (an optional leading sign is ignored)."""
+        stabilizers = [s.lstrip('+-') for s in stabilizers]
+        letters = np.frombuffer(''.join(stabilizers).encode(), dtype=np.uint8).reshape(len(stabilizers), -1)
+        x_part = (letters == ord('X')) | (letters == ord('Y'))
+        z_part = (letters == ord('Z')) | (letters == ord('Y'))
+        if not np.all(x_part | z_part | (letters == ord('I')) | (letters == ord('_'))):
+            raise ValueError("Pauli strings may only contain I, X, Y and Z")
+        return cls.from_parts(x_part, z_part)
+
+    @classmethod
+    def from_stim(cls, pauli_strings):
+        """Builds the matrix from an iterable of stim.PauliString (signs are dropped)."""
+        parts = [pauli_string.to_numpy() for pauli_string in pauli_strings]
+        return cls.from_parts(np.array([xs for xs, _ in parts]), np.array([zs for _, zs in parts]))
+
+    @classmethod
+    def from_text(cls, rows):
+        """Parses rows in the codetables.de '[x bits | z bits]' format."""
+        text = ' '.join(row.strip().strip('[]') for row in rows)
+        bits = np.array(text.replace('|', ' ').split(), dtype=np.uint8).reshape(len(rows), -1)
+        num_qubits = bits.shape[1] // 2
+        return cls.from_parts(bits[:, :num_qubits], bits[:, num_qubits:])
+
+    @property
+    def num_rows(self):
+        return self.x_words.shape[0]
+
+    @property
+    def shape(self):
+        return self.num_rows, self.num_qubits
+
+    def __len__(self):
+        return self.num_rows
+
+    @property
+    def x_part(self):
+        return gf2.unpack_rows(self.x_words, self.num_qubits)
+
+    @property
+    def z_part(self):
+        return gf2.unpack_rows(self.z_words, self.num_qubits)
+
+    def parts(self):
+        """Returns (x_part, z_part) as unpacked 0/1 arrays."""
+        return self.x_part, self.z_part
+
+    def to_pauli_strings(self):
+        codes = _PAULI_LETTERS[self.x_part + 2 * self.z_part]
+        text = codes.tobytes().decode()
+        return [text[i * self.num_qubits:(i + 1) * self.num_qubits] for i in range(self.num_rows)]
+
+    def to_stim(self):
+        x_part, z_part = self.parts()
+        return [stim.PauliString.from_numpy(xs=xs.astype(bool), zs=zs.astype(bool)) for xs, zs in zip(x_part, z_part)]
+
+    def to_text(self):
+        return [
+            '[' + ' '.join(map(str, x_row)) + '|' + ' '.join(map(str, z_row)) + ']'
+            for x_row, z_row in zip(self.x_part.tolist(), self.z_part.tolist())
+        ]
+
+    def symplectic_words(self):
+        """Rows of [x | z] packed back to back, x words first."""
+        return np.hstack([self.x_words, self.z_words])
+
+    def commutation_matrix(self):
+        """(rows, rows) bool matrix of pairwise symplectic inner products over GF(2); True means anticommuting."""
+        overlap = (self.x_words[:, None, :] & self.z_words[None, :, :]) ^ (self.z_words[:, None, :] & self.x_words[None, :, :])
+        return (gf2.popcount(overlap).sum(axis=2) & 1).astype(bool)
+
+    def rank(self):
+        return gf2.rank(self.symplectic_words())
+
+    def validate(self):
+        """Raises ValueError unless the rows are independent, mutually commuting stabilizers."""
+        if self.num_rows == 0 or self.num_qubits == 0:
+            raise ValueError("Stabilizer matrix is empty")
+        anticommuting = np.argwhere(np.triu(self.commutation_matrix(), 1))
+        if anticommuting.size:
+            i, j = anticommuting[0]
+            raise ValueError(f"Stabilizers {i} and {j} anticommute ({len(anticommuting)} anticommuting pairs)")
+        matrix_rank = self.rank()
+        if matrix_rank < self.num_rows:
+            raise ValueError(f"Stabilizers are not independent (rank {matrix_rank} < {self.num_rows} rows)")
+
+    def standard_form(self):
+        """Returns (matrix, x_pivots, z_pivots) for the two-stage row echelon form of gf2.standard_form."""
+        x_std, z_std, x_pivots, z_pivots = gf2.standard_form(self.x_part, self.z_part)
+        return StabilizerMatrix.from_parts(x_std, z_std), x_pivots, z_pivots
+
+    def logical_operators(self):
+        """
+        Returns (logical_x, logical_z) as StabilizerMatrix objects with one row per logical qubit.
+
+        Results are cached per content hash, so repeated calls for the same
+        code are free.
+        """
+        key = self.content_hash()
+        with _logical_cache_lock:
+            logicals = _logical_cache.get(key)
+            if logicals is not None:
+                _logical_cache.move_to_end(key)
+                return logicals
+
+        self.validate()
+        logical_x, logical_z = gf2.logical_operators(self.x_part, self.z_part)
+        n = self.num_qubits
+        logicals = (StabilizerMatrix.from_parts(logical_x[:, :n], logical_x[:, n:]),
+                    StabilizerMatrix.from_parts(logical_z[:, :n], logical_z[:, n:]))
+        with _logical_cache_lock:
+            _logical_cache[key] = logicals
+            while len(_logical_cache) > LOGICAL_CACHE_SIZE:
+                _logical_cache.popitem(last=False)
+        return logicals
+
+    def is_valid(self):
+        try:
+            self.validate()
+        except ValueError:
+            return False
+        return True
+
+    def content_hash(self):
+        """Hex digest of the shape and bitsets, stable across processes and runs."""
+        if self._digest is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(np.array(self.shape, dtype='<u8').tobytes())
+            digest.update(self.x_words.tobytes())
+            digest.update(self.z_words.tobytes())
+            self._digest = digest.hexdigest()
+        return self._digest
+
+    def __hash__(self):
+        return hash(self.content_hash())
+
+    def __eq__(self, other):
+        if not isinstance(other, StabilizerMatrix):
+            return NotImplemented
+        return (self.shape == other.shape
+                and np.array_equal(self.x_words, other.x_words)
+                and np.array_equal(self.z_words, other.z_words))
+
+    def __repr__(self):
+        return f"StabilizerMatrix({self.to_pauli_strings()!r})"
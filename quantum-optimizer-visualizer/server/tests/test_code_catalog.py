@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import code_catalog
+from stabilizer_matrix import StabilizerMatrix
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+X_PART = [[1, 0, 0, 1, 0], [0, 1, 0, 0, 1], [1, 0, 1, 0, 0], [0, 1, 0, 1, 0]]
+Z_PART = [[0, 1, 1, 0, 0], [0, 0, 1, 1, 0], [0, 0, 0, 1, 1], [1, 0, 0, 0, 1]]
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+def test_parse_extracts_the_matrix_rows():
+    rows = code_catalog.parse_stabilizer_matrix_html(read_fixture("qecc_n5_k1.html"))
+    assert rows == [
+        "[1 0 0 1 0|0 1 1 0 0]",
+        "[0 1 0 0 1|0 0 1 1 0]",
+        "[1 0 1 0 0|0 0 0 1 1]",
+        "[0 1 0 1 0|1 0 0 0 1]",
+    ]
+
+
+def test_parse_returns_none_without_a_matrix():
+    assert code_catalog.parse_stabilizer_matrix_html(read_fixture("no_matrix.html")) is None
+
+
+def test_import_and_lookup_round_trip(tmp_path):
+    path = str(tmp_path / "catalog.npz")
+    imported = code_catalog.import_html_pages(
+        [os.path.join(FIXTURES, "qecc_n5_k1.html"), os.path.join(FIXTURES, "no_matrix.html")], path=path
+    )
+    assert imported == [(5, 1)]
+    with np.load(path) as data:
+        assert data.files == ["n5_k1"]
+
+    # A fresh process reads the entry back from disk
+    code_catalog._catalogs.pop(path)
+    matrix = code_catalog.lookup(5, 1, path=path)
+    assert np.array_equal(matrix.x_part, X_PART)
+    assert np.array_equal(matrix.z_part, Z_PART)
+    assert code_catalog.lookup(5, 2, path=path) is None
+
+
+def test_save_keeps_entries_saved_by_another_process(tmp_path):
+    path = str(tmp_path / "catalog.npz")
+    matrix = StabilizerMatrix.from_parts(np.array(X_PART), np.array(Z_PART))
+    code_catalog.add(matrix, path=path, save=False)
+
+    # Another process saves a different entry after this one loaded the catalog
+    other = {"n7_k1": np.packbits(np.ones((6, 14), dtype=np.uint8), axis=1, bitorder='little')}
+    np.savez_compressed(path, **other)
+
+    code_catalog.save_catalog(path)
+    with np.load(path) as data:
+        assert sorted(data.files) == ["n5_k1", "n7_k1"]
+    assert "n7_k1" in code_catalog.load_catalog(path)
@@ -0,0 +1,90 @@
+import pytest
+import error_Calculation
+import artifact_cache
+from error_Calculation import (
+    generate_stim_circuit, build_decoder, estimate_logical_error_rate, get_compiled_artifacts,
+    simulate_stim_circuit, decode_outputs, calculate_error_rate
+)
+
+# [[5,1,3]] code; its derived logical X is not a Z-type operator
+STABILIZERS = ['XZZXI', 'IXZZX', 'XIXZZ', 'ZXIXZ']
+
+
+def _errors_flipping_observable(circuit):
+    return [
+        instruction for instruction in circuit.detector_error_model().flattened()
+        if instruction.type == "error" and any(target.is_logical_observable_id() for target in instruction.targets_copy())
+    ]
+
+
+def test_noiseless_circuit_is_deterministic():
+    circuit = generate_stim_circuit(STABILIZERS, 0, 3)
+    samples = circuit.compile_detector_sampler().sample(100, append_observables=True)
+    assert not samples.any()
+
+
+def test_every_stabilizer_has_a_detector_each_round():
+    num_rounds = 3
+    circuit = generate_stim_circuit(STABILIZERS, 0.01, num_rounds)
+    assert circuit.num_detectors == len(STABILIZERS) * (num_rounds + 1)
+
+
+@pytest.mark.parametrize("logical_x", [None, "11111"])
+def test_noise_can_flip_the_observable(logical_x):
+    circuit = generate_stim_circuit(STABILIZERS, 0.01, 3, logical_x)
+    assert _errors_flipping_observable(circuit)
+
+
+def test_estimated_error_rate_is_nonzero():
+    circuit = generate_stim_circuit(STABILIZERS, 0.02, 3)
+    error_rate, (low, high), num_shots = estimate_logical_error_rate(
+        circuit, min_errors=20, max_shots=4000, seed=1, decoder=build_decoder(circuit)
+    )
+    assert 0 < low <= error_rate <= high < 0.5
+    assert num_shots > 0
+
+
+@pytest.mark.parametrize("arguments", [
+    {"max_shots": 0},
+    {"max_shots": 50, "initial_batch": 100},
+    {"initial_batch": 0},
+    {"growth_factor": 0.5},
+])
+def test_estimate_rejects_invalid_arguments(arguments):
+    circuit = generate_stim_circuit(STABILIZERS, 0.02, 1)
+    with pytest.raises(ValueError):
+        estimate_logical_error_rate(circuit, **arguments)
+
+
+def test_seeded_estimate_does_not_depend_on_num_workers(monkeypatch):
+    # Shard even these small batches across processes
+    monkeypatch.setattr(error_Calculation, "MIN_PARALLEL_SAMPLE_BITS", 0)
+    circuit = generate_stim_circuit(STABILIZERS, 0.02, 1)
+    decoder = build_decoder(circuit)
+    estimates = [
+        estimate_logical_error_rate(circuit, min_errors=10**6, max_shots=700, seed=3, num_workers=num_workers, decoder=decoder)
+        for num_workers in (1, 2, 2)
+    ]
+    assert estimates[0] == estimates[1] == estimates[2]
+    assert estimates[0][2] == 700
+
+
+def test_compiled_decoder_corrects_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifact_cache, "ARTIFACT_CACHE_DIR", str(tmp_path))
+    artifacts = get_compiled_artifacts(STABILIZERS, 0.01, 3)
+    circuit = artifacts["circuit"]
+    detector_samples, observables = simulate_stim_circuit(circuit, 2000, seed=5)
+    assert detector_samples.any()
+    undecoded_rate = observables.mean()
+    decoded_rate, _ = calculate_error_rate(decode_outputs(circuit, detector_samples, decoder=artifacts["decoder"]), observables)
+    assert decoded_rate < undecoded_rate
+
+
+def test_small_runs_are_sampled_in_process(monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("a process pool was started")
+    monkeypatch.setattr(error_Calculation, "ProcessPoolExecutor", no_pool)
+    circuit = generate_stim_circuit(STABILIZERS, 0.02, 1)
+    detector_samples, _ = error_Calculation.simulate_stim_circuit(circuit, 1000, num_workers=4, seed=1)
+    assert detector_samples.shape == (1000, circuit.num_detectors)
+    estimate_logical_error_rate(circuit, max_shots=500, num_workers=4, seed=1)
@@ -0,0 +1,81 @@
+import json
+import time
+import pytest
+import app
+import jobs
+
+
+def fake_workflow(params, on_iteration=None):
+    """Stands in for run_optimize_job: one iteration every 50 ms, stopping when on_iteration returns False."""
+    for i in range(params.get("num_iterations", 25)):
+        time.sleep(0.05)
+        event = {"iteration": i + 1, "error_rate": 0.5 / (i + 1), "strategy": "gate_balancing", "best_x_part": [[1, 0]]}
+        if on_iteration(event) is False:
+            return {"iterations_run": i + 1}
+    return {"iterations_run": params.get("num_iterations", 25)}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def job_queue(request, tmp_path):
+    if request.param == "memory":
+        return jobs.InProcessJobQueue(concurrency=1, target=fake_workflow)
+    return jobs.SqliteJobQueue(str(tmp_path / "jobs.sqlite3"), concurrency=1, poll_interval=0.01, target=fake_workflow)
+
+
+def wait_until_finished(job_queue, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = job_queue.get(job_id)
+        if job["status"] in jobs.FINISHED:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_keeps_every_iteration_event(job_queue):
+    job_id = job_queue.submit({"n": 5, "k": 1, "d": 3, "num_iterations": 3})
+    job = wait_until_finished(job_queue, job_id)
+    assert job["status"] == jobs.SUCCEEDED
+    assert [event["iteration"] for event in job["iterations"]] == [1, 2, 3]
+    assert job["iterations"][0]["strategy"] == "gate_balancing"
+    assert job["error_rates"] == [event["error_rate"] for event in job["iterations"]]
+
+
+def test_cancel_stops_a_running_job(job_queue):
+    job_id = job_queue.submit({"n": 5, "k": 1, "d": 3, "num_iterations": 100})
+    while not job_queue.get(job_id)["iterations"]:
+        time.sleep(0.01)
+    assert job_queue.cancel(job_id) == jobs.RUNNING
+    job = wait_until_finished(job_queue, job_id)
+    assert job["status"] == jobs.CANCELLED
+    assert job["result"]["iterations_run"] < 100
+    assert job_queue.cancel("unknown") is None
+
+
+def test_stream_sends_iteration_events_and_cancels_on_disconnect(monkeypatch):
+    job_queue = jobs.InProcessJobQueue(concurrency=1, target=fake_workflow)
+    monkeypatch.setattr(jobs, "_job_queue", job_queue)
+    monkeypatch.setattr(app, "STREAM_POLL_SECONDS", 0.01)
+    client = app.app.test_client()
+
+    body = client.get('/optimize/stream?n=5&k=1&d=3&num_iterations=2').get_data(as_text=True)
+    assert body.count("event: iteration") == 2
+    assert '"strategy": "gate_balancing"' in body
+    assert "event: result" in body
+
+    response = client.get('/optimize/stream?n=5&k=1&d=3&num_iterations=100', buffered=False)
+    first_event = next(iter(response.response))
+    job_id = json.loads(first_event.decode().split("data: ", 1)[1])["job_id"]
+    response.close()
+    assert wait_until_finished(job_queue, job_id)["status"] == jobs.CANCELLED
+
+
+def test_cancel_endpoint(monkeypatch):
+    job_queue = jobs.InProcessJobQueue(concurrency=1, target=fake_workflow)
+    monkeypatch.setattr(jobs, "_job_queue", job_queue)
+    client = app.app.test_client()
+
+    job_id = client.post('/optimize/jobs', json={"n": 5, "k": 1, "d": 3, "num_iterations": 100}).get_json()["job_id"]
+    assert client.post(f'/optimize/jobs/{job_id}/cancel').status_code == 200
+    assert wait_until_finished(job_queue, job_id)["status"] == jobs.CANCELLED
+    assert client.post('/optimize/jobs/unknown/cancel').status_code == 404
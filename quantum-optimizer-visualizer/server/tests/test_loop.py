@@ -0,0 +1,19 @@
+import numpy as np
+import artifact_cache
+import loop
+
+# [[5,1,3]] code; neither optimization stage changes its matrices
+X_PART = np.array([[1, 0, 0, 1, 0], [0, 1, 0, 0, 1], [1, 0, 1, 0, 0], [0, 1, 0, 1, 0]])
+Z_PART = np.array([[0, 1, 1, 0, 0], [0, 0, 1, 1, 0], [0, 0, 0, 1, 1], [1, 0, 0, 0, 1]])
+
+
+def test_unchanged_matrices_report_no_improvement(tmp_path, monkeypatch):
+    monkeypatch.setenv("ARTIFACT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(artifact_cache, "ARTIFACT_CACHE_DIR", str(tmp_path))
+    loop.clear_stage_cache()
+
+    result = loop.run_workflow(X_PART, Z_PART, 5, 1, 3, num_iterations=1, num_workers=2)
+
+    assert result["best_x_part"] == X_PART.tolist()
+    assert result["best_z_part"] == Z_PART.tolist()
+    assert result["improvement"] == 0.0
@@ -0,0 +1,29 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from swap_gate_minimization import create_fully_connected_coupling_map, generate_qiskit_circuit, get_pass_manager
+
+X_PART = [[1, 0, 0, 1, 0], [0, 1, 0, 0, 1], [1, 0, 1, 0, 0], [0, 1, 0, 1, 0]]
+Z_PART = [[0, 1, 1, 0, 0], [0, 0, 1, 1, 0], [0, 0, 0, 1, 1], [1, 0, 0, 0, 1]]
+
+
+def test_pass_managers_are_not_shared_between_threads():
+    coupling_map = create_fully_connected_coupling_map(9)
+    pass_managers = []
+    thread = threading.Thread(target=lambda: pass_managers.append(get_pass_manager(coupling_map, 1, 0)))
+    thread.start()
+    thread.join()
+    assert get_pass_manager(coupling_map, 1, 0) is get_pass_manager(coupling_map, 1, 0)
+    assert pass_managers[0] is not get_pass_manager(coupling_map, 1, 0)
+
+
+def test_concurrent_transpiles_match_a_sequential_one():
+    qc = generate_qiskit_circuit(X_PART, Z_PART)
+    coupling_map = create_fully_connected_coupling_map(qc.num_qubits)
+    expected = get_pass_manager(coupling_map, 3, 0).run(qc)
+
+    def transpile(_):
+        return get_pass_manager(coupling_map, 3, 0).run(qc)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(transpile, range(8)))
+    assert all(result == expected for result in results)
@@ -0,0 +1,77 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Wall-clock time spent in each stage by this process: name -> [calls, seconds]
+_timings = {}
+_timings_lock = threading.Lock()
+
+
+def record_timing(name, seconds, calls=1):
+    with _timings_lock:
+        entry = _timings.setdefault(name, [0, 0.0])
+        entry[0] += calls
+        entry[1] += seconds
+
+
+@contextmanager
+def stage_timer(name):
+    """Times the body of a with block under name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorator recording every call of the function under name."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage_timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot_timings():
+    """Returns a copy of the raw {name: (calls, seconds)} record, for timing_info(since=...)."""
+    with _timings_lock:
+        return {name: tuple(entry) for name, entry in _timings.items()}
+
+
+def timing_info(since=None):
+    """
+    Returns {name: {"calls", "total_ms", "mean_ms"}} for every stage timed so
+    far, or only what was added after the snapshot_timings() record since.
+    """
+    since = since or {}
+    info = {}
+    for name, (calls, seconds) in snapshot_timings().items():
+        previous_calls, previous_seconds = since.get(name, (0, 0.0))
+        calls -= previous_calls
+        seconds -= previous_seconds
+        if calls > 0:
+            info[name] = {"calls": calls, "total_ms": seconds * 1000, "mean_ms": seconds * 1000 / calls}
+    return info
+
+
+def pop_timings():
+    """Returns the raw {name: (calls, seconds)} record and clears it, for handing to another process."""
+    with _timings_lock:
+        timings = {name: tuple(entry) for name, entry in _timings.items()}
+        _timings.clear()
+    return timings
+
+
+def merge_timings(timings):
+    """Adds a record returned by pop_timings in another process."""
+    for name, (calls, seconds) in timings.items():
+        record_timing(name, seconds, calls)
+
+
+def clear_timings():
+    with _timings_lock:
+        _timings.clear()
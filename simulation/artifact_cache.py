@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+import stim
+
+# Directory shared by every process that compiles circuits. Setting the
+# ARTIFACT_CACHE_DIR environment variable to an empty string disables the
+# disk cache.
+ARTIFACT_CACHE_DIR = os.environ.get(
+    "ARTIFACT_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "quantum-stabilizer-codes", "artifacts")
+)
+
+# Total size of the cache directory after which the least recently used
+# entries are evicted.
+ARTIFACT_CACHE_MAX_BYTES = int(os.environ.get("ARTIFACT_CACHE_MAX_BYTES", 256 * 2**20))
+
+# Bump whenever generate_stim_circuit changes the circuits it emits, so stale
+# entries are never served.
+ARTIFACT_FORMAT_VERSION = 2
+
+# Files of one entry. The circuit is written last and acts as the commit marker.
+# Transpiled circuits are single-file entries of their own.
+_SUFFIXES = (".lut.npz", ".dem", ".stim", ".qpy")
+
+
+def artifact_key(*params):
+    """Content hash of the generator parameters (and the format version)."""
+    payload = json.dumps([ARTIFACT_FORMAT_VERSION, *params], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def _path(key, suffix, cache_dir):
+    return os.path.join(cache_dir, key + suffix)
+
+
+def atomic_write(path, write):
+    """Writes through a temporary file in the same directory and renames it into place."""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        # mkstemp creates owner-only files; entries are meant to be shared
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def load_artifacts(key, cache_dir=None):
+    """
+    Returns (circuit, detector_error_model, lookup_table) for key, or None on a miss.
+
+    lookup_table is None when the entry has no decoder table. A hit refreshes
+    the entry's modification time, which eviction uses as its LRU clock.
+    """
+    cache_dir = ARTIFACT_CACHE_DIR if cache_dir is None else cache_dir
+    if not cache_dir:
+        return None
+    try:
+        circuit = stim.Circuit.from_file(_path(key, ".stim", cache_dir))
+        detector_error_model = stim.DetectorErrorModel.from_file(_path(key, ".dem", cache_dir))
+        lookup_table = None
+        table_path = _path(key, ".lut.npz", cache_dir)
+        if os.path.exists(table_path):
+            with np.load(table_path) as data:
+                lookup_table = data["table"]
+        for suffix in _SUFFIXES:
+            if os.path.exists(_path(key, suffix, cache_dir)):
+                os.utime(_path(key, suffix, cache_dir))
+    except (OSError, ValueError):
+        # Missing, evicted by another process or half-written before a crash
+        return None
+    return circuit, detector_error_model, lookup_table
+
+
+def store_artifacts(key, circuit, detector_error_model, lookup_table=None, cache_dir=None):
+    """Stores an entry atomically and evicts old entries; failures leave the cache unchanged."""
+    cache_dir = ARTIFACT_CACHE_DIR if cache_dir is None else cache_dir
+    if not cache_dir:
+        return
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        if lookup_table is not None:
+            atomic_write(_path(key, ".lut.npz", cache_dir), lambda f: np.savez(f, table=lookup_table))
+        atomic_write(_path(key, ".dem", cache_dir), lambda f: f.write(str(detector_error_model).encode()))
+        atomic_write(_path(key, ".stim", cache_dir), lambda f: f.write(str(circuit).encode()))
+        evict_artifacts(cache_dir=cache_dir)
+    except OSError as e:
+        print(f"Could not write artifact cache entry {key}: {e}")
+
+
+def load_transpiled(key, cache_dir=None):
+    """Returns the transpiled QuantumCircuit stored under key, or None on a miss."""
+    cache_dir = ARTIFACT_CACHE_DIR if cache_dir is None else cache_dir
+    if not cache_dir:
+        return None
+    from qiskit import qpy
+    from qiskit.exceptions import QiskitError
+
+    path = _path(key, ".qpy", cache_dir)
+    try:
+        with open(path, "rb") as f:
+            circuit = qpy.load(f)[0]
+        os.utime(path)
+    except (OSError, ValueError, QiskitError):
+        return None
+    return circuit
+
+
+def store_transpiled(key, circuit, cache_dir=None):
+    """Stores a transpiled circuit in QPY form; failures leave the cache unchanged."""
+    cache_dir = ARTIFACT_CACHE_DIR if cache_dir is None else cache_dir
+    if not cache_dir:
+        return
+    from qiskit import qpy
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        atomic_write(_path(key, ".qpy", cache_dir), lambda f: qpy.dump(circuit, f))
+        evict_artifacts(cache_dir=cache_dir)
+    except OSError as e:
+        print(f"Could not write transpiled circuit {key}: {e}")
+
+
+def evict_artifacts(max_bytes=None, cache_dir=None):
+    """Removes least recently used entries until the directory holds at most max_bytes."""
+    cache_dir = ARTIFACT_CACHE_DIR if cache_dir is None else cache_dir
+    max_bytes = ARTIFACT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = {}
+    for entry in os.scandir(cache_dir):
+        key, dot, _ = entry.name.partition(".")
+        if not dot or not key:
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        size, last_used = entries.get(key, (0, 0.0))
+        entries[key] = (size + stat.st_size, max(last_used, stat.st_mtime))
+
+    total = sum(size for size, _ in entries.values())
+    for key, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+        if total <= max_bytes:
+            break
+        for suffix in _SUFFIXES:
+            try:
+                os.unlink(_path(key, suffix, cache_dir))
+            except FileNotFoundError:
+                pass
+        total -= size
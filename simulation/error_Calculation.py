@@ -1,90 +1,344 @@
 import stim
 import numpy as np
-from stimbposd import BPOSD
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from stabilizer_matrix import StabilizerMatrix
+import artifact_cache
 
-def generate_stim_circuit(stabilizers, p, num_rounds, logical_x):
+# Number of shots drawn per shard when sampling is split across processes.
+# Shards are seeded from the master seed independently of the worker count,
+# so a given seed yields the same samples however many workers are used.
+DEFAULT_SHARD_SIZE = 100_000
+
+# Sampling work, in shots times measurements per shot, below which a process
+# pool costs more to start and feed than it saves. Smaller runs are sampled in
+# this process even when workers are requested (1e6 shots of a 25-measurement
+# circuit take about 0.2 s on one core and longer on four).
+MIN_PARALLEL_SAMPLE_BITS = 200_000_000
+
+# Maximum number of compiled circuits kept by get_compiled_artifacts.
+COMPILED_CACHE_SIZE = 64
+_compiled_cache = OrderedDict()
+
+# build_decoder uses an exact lookup table instead of BP+OSD when the circuit
+# has at most this many detectors (and at most LOOKUP_TABLE_MAX_OBSERVABLES
+# observables); the table has 2**num_detectors entries.
+LOOKUP_TABLE_MAX_DETECTORS = 16
+LOOKUP_TABLE_MAX_OBSERVABLES = 4
+
+def schedule_stabilizer_layers(stabilizers, num_data_qubits):
+    """
+    Schedules the controlled-Pauli gates of all stabilizer measurements into
+    conflict-free layers and returns one {gate: flat target array} dict per layer.
+
+    Gate (i, j) goes to layer shift[i] + j, where shift[i] is one more than the
+    largest shift of any earlier stabilizer sharing a data qubit with row i.
+    Each ancilla and data qubit is therefore touched once per layer, and every
+    data qubit still sees the ancillas in their original order, so the layered
+    circuit implements the same unitary as measuring the stabilizers one by one.
+    """
+    paulis = np.frombuffer(''.join(stabilizers).encode(), dtype=np.uint8).reshape(len(stabilizers), -1)
+    x_part = (paulis == ord('X')) | (paulis == ord('Y'))
+    z_part = (paulis == ord('Z')) | (paulis == ord('Y'))
+    support = x_part | z_part
+
+    overlap = (support.astype(np.int64) @ support.T.astype(np.int64)) > 0
+    shifts = np.zeros(len(stabilizers), dtype=np.int64)
+    for i in range(1, len(stabilizers)):
+        earlier = np.flatnonzero(overlap[i, :i])
+        if earlier.size:
+            shifts[i] = shifts[earlier].max() + 1
+
+    rows, cols = np.nonzero(support)
+    _, layer_index = np.unique(shifts[rows] + cols, return_inverse=True)
+    pairs = np.column_stack((rows + num_data_qubits, cols))
+    gate_kinds = {
+        "CX": x_part[rows, cols] & ~z_part[rows, cols],
+        "CZ": z_part[rows, cols] & ~x_part[rows, cols],
+        "CY": x_part[rows, cols] & z_part[rows, cols],
+    }
+
+    layers = []
+    for layer in range(layer_index.max() + 1 if layer_index.size else 0):
+        in_layer = layer_index == layer
+        layers.append({
+            gate: pairs[in_layer & kind].ravel()
+            for gate, kind in gate_kinds.items()
+            if np.any(in_layer & kind)
+        })
+    return layers
+
+def _stabilizer_round_circuit(stabilizers, num_data_qubits, p):
+    """
+    Returns one round of layered stabilizer measurements followed by noise:
+    depolarizing errors on the data qubits and X (reset) errors on the ancillas.
+    With p=0 the round is noiseless.
+    """
+    num_total_qubits = num_data_qubits + len(stabilizers)
+    ancillas = range(num_data_qubits, num_total_qubits)
+    round_circuit = stim.Circuit()
+    round_circuit.append("H", ancillas)
+    for layer in schedule_stabilizer_layers(stabilizers, num_data_qubits):
+        round_circuit.append("TICK")
+        for gate, targets in layer.items():
+            round_circuit.append(gate, targets)
+    round_circuit.append("TICK")
+    round_circuit.append("H", ancillas)
+    round_circuit.append_operation("MR", ancillas)
+
+    # Depolarizing noise can flip any logical operator, whatever its basis
+    if p > 0:
+        round_circuit.append_operation("DEPOLARIZE1", range(num_data_qubits), p)
+        round_circuit.append_operation("X_ERROR", ancillas, p)
+    return round_circuit
+
+def logical_observable(stabilizers, logical_x=None):
+    """
+    Returns the Pauli string of the logical operator used as observable 0.
+
+    With logical_x=None the first logical X derived by
+    StabilizerMatrix.logical_operators() is used. A '0'/'1' string instead
+    selects the data qubits whose Z-basis outcomes form the observable.
+    """
+    if logical_x is not None:
+        return ''.join('Z' if bit == '1' else 'I' for bit in logical_x)
+    logical_xs, _ = StabilizerMatrix.from_pauli_strings(stabilizers).logical_operators()
+    if len(logical_xs) == 0:
+        raise ValueError("The stabilizers encode no logical qubit")
+    return logical_xs.to_pauli_strings()[0]
+
+def _basis_change(bases):
+    """Gates rotating the Z basis onto each data qubit's measurement basis (self-inverse)."""
+    rotation = stim.Circuit()
+    for gate, basis in (("H", 'X'), ("H_YZ", 'Y')):
+        targets = [q for q, b in enumerate(bases) if b == basis]
+        if targets:
+            rotation.append(gate, targets)
+    return rotation
+
+def generate_stim_circuit(stabilizers, p, num_rounds, logical_x=None):
+    """
+    Memory experiment protecting one logical qubit over num_rounds noisy rounds
+    of stabilizer measurements.
+
+    Data qubits are prepared and finally measured in the basis of the logical
+    observable on them (Z where it acts trivially), so the observable is
+    deterministic. A noiseless first round projects onto the code space and
+    a noiseless last round reads the final syndrome, so every stabilizer gets
+    a detector in every noisy round whatever its basis.
+    """
     circuit = stim.Circuit()
     num_data_qubits = len(stabilizers[0])
     num_stabilizers = len(stabilizers)
     num_total_qubits = num_data_qubits + num_stabilizers
 
+    logical = logical_observable(stabilizers, logical_x)
+    bases = [pauli if pauli != 'I' else 'Z' for pauli in logical]
+
     # Define QUBIT_COORDS with only 2 parameters
     for i in range(num_data_qubits):
         circuit.append("QUBIT_COORDS", [i], [0, i])
     for i in range(num_stabilizers):
         circuit.append("QUBIT_COORDS", [num_data_qubits + i], [1, i])
 
-    # Initialize all qubits
+    # Initialize all qubits, data qubits in the observable's basis
     circuit.append_operation("R", range(num_total_qubits))
+    circuit += _basis_change(bases)
 
-    # Apply initial X errors to all qubits
-    circuit.append_operation("X_ERROR", range(num_total_qubits), p)
-
-    # Create the repeated part of the circuit
-    for round in range(num_rounds):
-        # Measure stabilizers
-        for i, stabilizer in enumerate(stabilizers):
-            ancilla = num_data_qubits + i
-            circuit.append("H", ancilla)
-            for j, pauli in enumerate(stabilizer):
-                if pauli == 'X':
-                    circuit.append("CX", [ancilla, j])
-                elif pauli == 'Z':
-                    circuit.append("CZ", [ancilla, j])
-                elif pauli == 'Y':
-                    circuit.append("CY", [ancilla, j])
-            circuit.append("H", ancilla)
-            circuit.append_operation("M", [ancilla])
-
-        # Apply X errors to all qubits
-        circuit.append_operation("X_ERROR", range(num_total_qubits), p)
-
-        # Add DETECTOR for each stabilizer measurement
-        if round == 0:  # First round
-            for i in range(num_stabilizers):
-                circuit.append("DETECTOR", [stim.target_rec(-1-i)], [1, i, 0])
-        else:
-            # Add SHIFT_COORDS before DETECTOR
-            circuit.append("SHIFT_COORDS", [], [0, 0, 1])
-            for i in range(num_stabilizers):
-                circuit.append("DETECTOR", [
-                    stim.target_rec(-1-i),
-                    stim.target_rec(-1-i-num_stabilizers)
-                ], [1, i, 0])
-
-    # Measure data qubits at the end
-    circuit.append_operation("M", range(num_data_qubits))
+    # Reference round: projects onto the code space, its random outcomes anchor the first detectors
+    circuit += _stabilizer_round_circuit(stabilizers, num_data_qubits, 0)
 
-    # Add SHIFT_COORDS before final DETECTOR
-    circuit.append("SHIFT_COORDS", [], [0, 0, 1])
+    # Noisy rounds: identical, so emitted once inside a REPEAT block
+    noisy_round = _stabilizer_round_circuit(stabilizers, num_data_qubits, p)
+    for i in range(num_stabilizers):
+        noisy_round.append("DETECTOR", [
+            stim.target_rec(i - num_stabilizers),
+            stim.target_rec(i - 2 * num_stabilizers)
+        ], [1, i, 0])
+    noisy_round.append("SHIFT_COORDS", [], [0, 0, 1])
+    circuit += noisy_round * num_rounds
 
-    # Add final DETECTOR for each stabilizer
+    # Readout round: noiseless, compares the final syndrome with the last noisy round
+    circuit += _stabilizer_round_circuit(stabilizers, num_data_qubits, 0)
     for i in range(num_stabilizers):
         circuit.append("DETECTOR", [
-            stim.target_rec(-1-i-num_data_qubits),
-            stim.target_rec(-1-i-num_data_qubits-num_stabilizers)
-        ], [1, i, 1])
+            stim.target_rec(i - num_stabilizers),
+            stim.target_rec(i - 2 * num_stabilizers)
+        ], [1, i, 0])
 
-    # Add OBSERVABLE_INCLUDE for logical X operator
-    logical_x_indices = [i for i, x in enumerate(logical_x) if x == '1']
-    circuit.append("OBSERVABLE_INCLUDE", [stim.target_rec(-i-1) for i in logical_x_indices], 0)
+    # Measure data qubits at the end, in the same bases they were prepared in
+    circuit += _basis_change(bases)
+    circuit.append_operation("M", range(num_data_qubits))
+
+    # Add OBSERVABLE_INCLUDE for the logical operator
+    circuit.append("OBSERVABLE_INCLUDE", [
+        stim.target_rec(j - num_data_qubits) for j, pauli in enumerate(logical) if pauli != 'I'
+    ], 0)
 
     return circuit
 
-def simulate_stim_circuit(circuit, num_shots):
-    detector_sampler = circuit.compile_detector_sampler()
-    detector_samples, observables = detector_sampler.sample(num_shots, separate_observables=True)
+def _sample_shard(circuit_text, num_shots, seed):
+    """Samples one shard in a worker process and returns bit-packed arrays."""
+    circuit = stim.Circuit(circuit_text)
+    detector_sampler = circuit.compile_detector_sampler(seed=seed)
+    return detector_sampler.sample(num_shots, separate_observables=True, bit_packed=True)
+
+def _shard_plan(num_shots, seed, shard_size):
+    """Splits num_shots into shards and derives an independent seed for each one."""
+    num_shards = max(1, -(-num_shots // shard_size))
+    shard_shots = [shard_size] * (num_shards - 1) + [num_shots - shard_size * (num_shards - 1)]
+    children = np.random.SeedSequence(seed).spawn(num_shards)
+    shard_seeds = [int(child.generate_state(1, dtype=np.uint64)[0]) for child in children]
+    return shard_shots, shard_seeds
+
+def worth_parallel_sampling(circuit, num_shots):
+    """Whether sampling num_shots shots of circuit is large enough to split across processes."""
+    return num_shots * circuit.num_measurements >= MIN_PARALLEL_SAMPLE_BITS
+
+def simulate_stim_circuit(circuit, num_shots, num_workers=1, seed=None, shard_size=DEFAULT_SHARD_SIZE, sampler=None, executor=None):
+    """
+    Samples detector and observable outcomes for num_shots shots.
+
+    With num_workers > 1 and at least MIN_PARALLEL_SAMPLE_BITS of work, the
+    shot budget is split into shards of shard_size shots that are sampled in
+    a process pool and concatenated in shard order. Every shard gets its own
+    seed spawned from seed, so results are reproducible for a given master
+    seed regardless of num_workers.
+
+    A precompiled sampler (e.g. from get_compiled_artifacts) is used for
+    unsharded runs; it carries its own RNG state, so seed is ignored then.
+    Callers sampling repeatedly can pass their own executor, which is used
+    instead of starting a pool of num_workers processes for this call.
+    """
+    if executor is not None:
+        num_workers = max(num_workers, 2)
+    if not worth_parallel_sampling(circuit, num_shots):
+        num_workers = 1
+    if num_workers <= 1 and (sampler is not None or (seed is None and num_shots <= shard_size)):
+        detector_sampler = sampler if sampler is not None else circuit.compile_detector_sampler()
+        detector_samples, observables = detector_sampler.sample(num_shots, separate_observables=True)
+        return detector_samples, observables
+
+    shard_shots, shard_seeds = _shard_plan(num_shots, seed, shard_size)
+    if num_workers <= 1:
+        shards = [
+            circuit.compile_detector_sampler(seed=shard_seed).sample(shots, separate_observables=True, bit_packed=True)
+            for shots, shard_seed in zip(shard_shots, shard_seeds)
+        ]
+    elif executor is not None:
+        shards = list(executor.map(_sample_shard, [str(circuit)] * len(shard_shots), shard_shots, shard_seeds))
+    else:
+        with ProcessPoolExecutor(max_workers=min(num_workers, len(shard_shots))) as executor:
+            shards = list(executor.map(_sample_shard, [str(circuit)] * len(shard_shots), shard_shots, shard_seeds))
+
+    packed_detectors = np.concatenate([detectors for detectors, _ in shards])
+    packed_observables = np.concatenate([observables for _, observables in shards])
+    detector_samples = np.unpackbits(packed_detectors, axis=1, count=circuit.num_detectors, bitorder='little').astype(bool)
+    observables = np.unpackbits(packed_observables, axis=1, count=circuit.num_observables, bitorder='little').astype(bool)
     return detector_samples, observables
 
-def decode_outputs(circuit, detector_samples):
-    decoder = BPOSD(
-        circuit.detector_error_model(),
+class LookupTableDecoder:
+    """
+    Maximum-likelihood decoder for detector error models with few detectors.
+
+    The joint distribution over (syndrome, observable flips) is built once by
+    folding in every error mechanism of the model. The table then stores, for
+    each syndrome integer, the most likely observable mask, so decoding is a
+    single vectorized index into a 2**num_detectors array.
+    """
+
+    def __init__(self, detector_error_model):
+        self.num_detectors = detector_error_model.num_detectors
+        self.num_observables = detector_error_model.num_observables
+        num_states = 1 << (self.num_detectors + self.num_observables)
+
+        # Merge mechanisms with identical symptoms before the fold.
+        mechanisms = {}
+        for instruction in detector_error_model.flattened():
+            if instruction.type != "error":
+                continue
+            mask = 0
+            for target in instruction.targets_copy():
+                if target.is_relative_detector_id():
+                    mask ^= 1 << target.val
+                elif target.is_logical_observable_id():
+                    mask ^= 1 << (self.num_detectors + target.val)
+            if mask == 0:
+                continue
+            p = instruction.args_copy()[0]
+            q = mechanisms.get(mask, 0.0)
+            mechanisms[mask] = q * (1 - p) + p * (1 - q)
+
+        distribution = np.zeros(num_states)
+        distribution[0] = 1.0
+        states = np.arange(num_states)
+        for mask, p in mechanisms.items():
+            distribution = (1 - p) * distribution + p * distribution[states ^ mask]
+
+        joint = distribution.reshape(1 << self.num_observables, 1 << self.num_detectors)
+        self.table = np.argmax(joint, axis=0).astype(np.min_scalar_type((1 << self.num_observables) - 1))
+        self._weights = np.left_shift(np.uint64(1), np.arange(self.num_detectors, dtype=np.uint64))
+
+    @classmethod
+    def from_table(cls, table, num_detectors, num_observables):
+        """Rebuilds a decoder from a previously computed table (e.g. loaded from the artifact cache)."""
+        decoder = cls.__new__(cls)
+        decoder.num_detectors = num_detectors
+        decoder.num_observables = num_observables
+        decoder.table = table
+        decoder._weights = np.left_shift(np.uint64(1), np.arange(num_detectors, dtype=np.uint64))
+        return decoder
+
+    def decode_batch(self, detector_samples):
+        syndromes = np.asarray(detector_samples, dtype=np.uint64) @ self._weights
+        masks = self.table[syndromes]
+        return ((masks[:, None] >> np.arange(self.num_observables)) & 1).astype(bool)
+
+def build_decoder(circuit, detector_error_model=None, lookup_table=None):
+    if detector_error_model is None:
+        detector_error_model = circuit.detector_error_model()
+    if (detector_error_model.num_detectors <= LOOKUP_TABLE_MAX_DETECTORS
+            and detector_error_model.num_observables <= LOOKUP_TABLE_MAX_OBSERVABLES):
+        if lookup_table is not None:
+            return LookupTableDecoder.from_table(lookup_table, detector_error_model.num_detectors, detector_error_model.num_observables)
+        return LookupTableDecoder(detector_error_model)
+
+    # Deferred: stimbposd pulls in ldpc and scipy, which small codes never need
+    from stimbposd import BPOSD
+    return BPOSD(
+        detector_error_model,
         max_bp_iters=20,
         bp_method="msl",
         osd_method="osd0",
         osd_order=0
     )
-    predicted_observables = decoder.decode_batch(detector_samples)
+
+def decode_unique_syndromes(decoder, detector_samples, num_observables):
+    """
+    Decodes each distinct syndrome once and scatters the predictions back to every shot.
+
+    Detector rows are bit-packed and grouped with np.unique; all-zero rows are
+    answered with no observable flip without calling the decoder.
+    """
+    detector_samples = np.asarray(detector_samples, dtype=bool)
+    predicted_observables = np.zeros((detector_samples.shape[0], num_observables), dtype=bool)
+    packed = np.packbits(detector_samples, axis=1, bitorder='little')
+    nontrivial = packed.any(axis=1)
+    if not nontrivial.any():
+        return predicted_observables
+
+    nontrivial_rows = np.ascontiguousarray(packed[nontrivial])
+    keys = nontrivial_rows.view(np.dtype((np.void, nontrivial_rows.shape[1]))).ravel()
+    _, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    unique_syndromes = detector_samples[nontrivial][first_index]
+    unique_predictions = np.asarray(decoder.decode_batch(unique_syndromes), dtype=bool)
+    predicted_observables[nontrivial] = unique_predictions[inverse.ravel()]
+    return predicted_observables
+
+def decode_outputs(circuit, detector_samples, decoder=None):
+    if decoder is None:
+        decoder = build_decoder(circuit)
+    predicted_observables = decode_unique_syndromes(decoder, detector_samples, circuit.num_observables)
     return predicted_observables
 
 def calculate_error_rate(predicted_observables, observables):
@@ -92,24 +346,124 @@ def calculate_error_rate(predicted_observables, observables):
     error_rate = num_mistakes / len(observables)
     return error_rate, num_mistakes
 
+def wilson_interval(num_mistakes, num_shots, z=1.96):
+    """Returns the Wilson score interval for a binomial error rate."""
+    if num_shots == 0:
+        return 0.0, 1.0
+    rate = num_mistakes / num_shots
+    denominator = 1 + z ** 2 / num_shots
+    center = (rate + z ** 2 / (2 * num_shots)) / denominator
+    half_width = z * np.sqrt(rate * (1 - rate) / num_shots + z ** 2 / (4 * num_shots ** 2)) / denominator
+    return max(0.0, float(center - half_width)), min(1.0, float(center + half_width))
+
+def estimate_logical_error_rate(circuit, target_relative_error=0.1, min_errors=100, max_shots=10_000,
+                                initial_batch=100, growth_factor=2, num_workers=1, seed=None, z=1.96,
+                                decoder=None, sampler=None):
+    """
+    Estimates the logical error rate by sampling and decoding in growing batches.
+
+    Sampling stops as soon as the confidence interval half-width drops below
+    target_relative_error times the estimate, min_errors logical errors have
+    been seen, or max_shots shots have been used, whichever comes first.
+
+    With a seed, every batch is sampled from seeds derived from it through
+    SeedSequence, so the estimate does not depend on num_workers. A
+    precompiled sampler is only used for unseeded estimates.
+
+    Returns:
+    - (error_rate, (low, high), num_shots): the estimate, its Wilson
+      confidence interval and the number of shots spent.
+    """
+    if max_shots < 1:
+        raise ValueError(f"max_shots must be at least 1, got {max_shots}")
+    if not 1 <= initial_batch <= max_shots:
+        raise ValueError(f"initial_batch must be between 1 and max_shots={max_shots}, got {initial_batch}")
+    if growth_factor < 1:
+        raise ValueError(f"growth_factor must be at least 1, got {growth_factor}")
+
+    if decoder is None:
+        decoder = build_decoder(circuit)
+    if seed is not None:
+        sampler = None
+    batch_seeds = np.random.SeedSequence(seed)
+    num_shots = 0
+    num_mistakes = 0
+    batch_size = initial_batch
+
+    # One pool serves every batch instead of one started per batch, if any batch can use it
+    executor = None
+    if num_workers > 1 and worth_parallel_sampling(circuit, max_shots):
+        executor = ProcessPoolExecutor(max_workers=num_workers)
+    try:
+        while True:
+            batch_size = min(batch_size, max_shots - num_shots)
+            batch_seed = int(batch_seeds.spawn(1)[0].generate_state(1, dtype=np.uint64)[0])
+            detector_samples, observables = simulate_stim_circuit(
+                circuit, batch_size, num_workers=num_workers, seed=batch_seed, sampler=sampler, executor=executor
+            )
+            predicted_observables = decode_outputs(circuit, detector_samples, decoder=decoder)
+            _, batch_mistakes = calculate_error_rate(predicted_observables, observables)
+            num_shots += batch_size
+            num_mistakes += int(batch_mistakes)
+
+            error_rate = num_mistakes / num_shots
+            low, high = wilson_interval(num_mistakes, num_shots, z)
+            if num_mistakes > 0 and (high - low) / 2 <= target_relative_error * error_rate:
+                break
+            if num_mistakes >= min_errors or num_shots >= max_shots:
+                break
+            batch_size = int(batch_size * growth_factor)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return error_rate, (low, high), num_shots
+
+def get_compiled_artifacts(stabilizers, p, num_rounds, logical_x=None):
+    """
+    Returns the circuit, detector error model, detector sampler and decoder
+    for the given generate_stim_circuit arguments, building them on a miss.
+
+    Entries are kept in an in-process LRU of at most COMPILED_CACHE_SIZE
+    entries, backed by the on-disk artifact_cache shared between processes.
+    The noise model is fully determined by p, so the key is the generator's
+    argument tuple.
+    """
+    key = (tuple(stabilizers), float(p), num_rounds, logical_x)
+    artifacts = _compiled_cache.get(key)
+    if artifacts is not None:
+        _compiled_cache.move_to_end(key)
+        return artifacts
+
+    # Other processes may already have compiled this circuit into the disk cache
+    disk_key = artifact_cache.artifact_key("simulation", list(stabilizers), float(p), num_rounds, logical_x)
+    cached = artifact_cache.load_artifacts(disk_key)
+    if cached is not None:
+        circuit, detector_error_model, lookup_table = cached
+        decoder = build_decoder(circuit, detector_error_model, lookup_table)
+    else:
+        circuit = generate_stim_circuit(stabilizers, p, num_rounds, logical_x)
+        detector_error_model = circuit.detector_error_model()
+        decoder = build_decoder(circuit, detector_error_model)
+        lookup_table = decoder.table if isinstance(decoder, LookupTableDecoder) else None
+        artifact_cache.store_artifacts(disk_key, circuit, detector_error_model, lookup_table)
+
+    artifacts = {
+        "circuit": circuit,
+        "detector_error_model": detector_error_model,
+        "sampler": circuit.compile_detector_sampler(),
+        "decoder": decoder,
+    }
+    _compiled_cache[key] = artifacts
+    while len(_compiled_cache) > COMPILED_CACHE_SIZE:
+        _compiled_cache.popitem(last=False)
+    return artifacts
+
+def clear_compiled_cache():
+    _compiled_cache.clear()
+
 def convert_to_stabilizers(x_part, z_part):
-    if x_part.shape != z_part.shape:
-        raise ValueError("x_part and z_part matrices must have the same shape")
-    
-    stabilizers = []
-    for i in range(x_part.shape[0]):
-        stabilizer = ''
-        for j in range(x_part.shape[1]):
-            if x_part[i, j] == 1 and z_part[i, j] == 0:
-                stabilizer += 'X'
-            elif x_part[i, j] == 0 and z_part[i, j] == 1:
-                stabilizer += 'Z'
-            elif x_part[i, j] == 1 and z_part[i, j] == 1:
-                stabilizer += 'Y'
-            else:
-                stabilizer += 'I'
-        stabilizers.append(stabilizer)
-    return stabilizers
+    return StabilizerMatrix.from_parts(x_part, z_part).to_pauli_strings()
 
 
 
@@ -137,7 +491,7 @@ def main():
     num_shots = 100
 
     # circuit = generate_stim_circuit(stabilizers, p, num_rounds, '11111', '11111')
-    circuit = generate_stim_circuit(stabilizers, p, num_rounds, '11111')
+    circuit = generate_stim_circuit(stabilizers, p, num_rounds)
     print("Circuit:")
     print(circuit)
 
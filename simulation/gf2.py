@@ -0,0 +1,144 @@
+import numpy as np
+
+_ONE = np.uint64(1)
+
+
+def pack_rows(bits):
+    """Packs a (rows, n) 0/1 array into little-endian uint64 words, shape (rows, max(1, ceil(n / 64)))."""
+    bits = np.asarray(bits, dtype=bool)
+    num_rows, num_bits = bits.shape
+    num_words = max(1, -(-num_bits // 64))
+    num_bytes = -(-num_bits // 8)
+    packed = np.zeros((num_rows, num_words * 8), dtype=np.uint8)
+    packed[:, :num_bytes] = np.packbits(bits, axis=1, bitorder='little')
+    return packed.view('<u8')
+
+
+def unpack_rows(words, num_bits):
+    """Inverse of pack_rows, returning a (rows, num_bits) uint8 array of 0/1."""
+    return np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=1, count=num_bits, bitorder='little')
+
+
+def popcount(words):
+    """Number of set bits in each uint64 word."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words)
+    bytes_view = np.ascontiguousarray(words).view(np.uint8).reshape(*words.shape, 8)
+    return np.unpackbits(bytes_view, axis=-1).sum(axis=-1)
+
+
+def row_reduce(words, num_bits=None, start_bit=0):
+    """
+    Gauss-Jordan elimination over GF(2) on rows packed as little-endian uint64 words.
+
+    Pivots are searched in bits start_bit..num_bits-1 only. Every pivot step
+    XORs the pivot row into all other rows holding that bit in one vectorized
+    operation. Returns (reduced, pivots) where reduced is the reduced row
+    echelon form (zero rows last) and pivots lists the pivot bit of each
+    leading row.
+    """
+    rows = np.array(words, dtype=np.uint64, copy=True)
+    if num_bits is None:
+        num_bits = rows.shape[1] * 64
+    pivots = []
+    rank = 0
+    for bit in range(start_bit, num_bits):
+        if rank == rows.shape[0]:
+            break
+        word, offset = divmod(bit, 64)
+        column = ((rows[:, word] >> np.uint64(offset)) & _ONE).astype(bool)
+        candidates = np.flatnonzero(column[rank:])
+        if candidates.size == 0:
+            continue
+        pivot = rank + candidates[0]
+        if pivot != rank:
+            rows[[rank, pivot]] = rows[[pivot, rank]]
+            column[[rank, pivot]] = column[[pivot, rank]]
+        column[rank] = False
+        rows[column] ^= rows[rank]
+        pivots.append(bit)
+        rank += 1
+    return rows, pivots
+
+
+def rank(words, num_bits=None):
+    return len(row_reduce(words, num_bits)[1])
+
+
+def nullspace(bits):
+    """Basis of {v : bits @ v = 0 (mod 2)} for a (rows, n) 0/1 matrix, as a (n - rank, n) uint8 array."""
+    bits = np.asarray(bits, dtype=np.uint8)
+    num_bits = bits.shape[1]
+    reduced, pivots = row_reduce(pack_rows(bits), num_bits)
+    reduced = unpack_rows(reduced[:len(pivots)], num_bits)
+    free = np.setdiff1d(np.arange(num_bits), pivots)
+    basis = np.zeros((free.size, num_bits), dtype=np.uint8)
+    basis[np.arange(free.size), free] = 1
+    if pivots:
+        basis[:, pivots] = reduced[:, free].T
+    return basis
+
+
+def standard_form(x_part, z_part):
+    """
+    Two-stage reduced row echelon form of a stabilizer matrix [x | z].
+
+    Rows are first reduced on the X columns; the rows left without an X pivot
+    are then reduced on the Z columns. This is the standard form up to the
+    qubit permutation that would move the pivots to the leading columns.
+    Returns (x_std, z_std, x_pivots, z_pivots) with pivots given as qubit indices.
+    """
+    num_qubits = np.shape(x_part)[1]
+    words = pack_rows(np.hstack([x_part, z_part]))
+    reduced, x_pivots = row_reduce(words, num_qubits)
+    tail, z_pivots = row_reduce(reduced[len(x_pivots):], 2 * num_qubits, start_bit=num_qubits)
+    reduced[len(x_pivots):] = tail
+    bits = unpack_rows(reduced, 2 * num_qubits)
+    return bits[:, :num_qubits], bits[:, num_qubits:], x_pivots, [bit - num_qubits for bit in z_pivots]
+
+
+def symplectic_products(x_rows, z_rows, x_vector, z_vector):
+    """Symplectic inner product over GF(2) of every row with one vector."""
+    return ((x_rows & z_vector) ^ (z_rows & x_vector)).sum(axis=1) & 1
+
+
+def logical_operators(x_part, z_part):
+    """
+    Returns (logical_x, logical_z): k pairs of logical operators as (k, 2n) 0/1 arrays [x | z].
+
+    The normalizer of the stabilizer group is the nullspace of [z | x].
+    Symplectic Gram-Schmidt over a basis of it pairs up operators with
+    <X_i, Z_j> = delta_ij and <X_i, X_j> = <Z_i, Z_j> = 0; vectors without a
+    partner lie in the stabilizer group and are discarded.
+    """
+    x_part = np.asarray(x_part, dtype=np.uint8)
+    z_part = np.asarray(z_part, dtype=np.uint8)
+    num_qubits = x_part.shape[1]
+    normalizer = nullspace(np.hstack([z_part, x_part]))
+    pool_x = normalizer[:, :num_qubits].copy()
+    pool_z = normalizer[:, num_qubits:].copy()
+
+    logical_x, logical_z = [], []
+    while len(pool_x):
+        a_x, a_z = pool_x[0], pool_z[0]
+        pool_x, pool_z = pool_x[1:], pool_z[1:]
+        partners = np.flatnonzero(symplectic_products(pool_x, pool_z, a_x, a_z))
+        if partners.size == 0:
+            continue
+        b_x, b_z = pool_x[partners[0]], pool_z[partners[0]]
+        keep = np.arange(len(pool_x)) != partners[0]
+        pool_x, pool_z = pool_x[keep], pool_z[keep]
+
+        # Make the remaining vectors commute with both a and b
+        with_b = symplectic_products(pool_x, pool_z, b_x, b_z).astype(bool)
+        with_a = symplectic_products(pool_x, pool_z, a_x, a_z).astype(bool)
+        pool_x[with_b] ^= a_x
+        pool_z[with_b] ^= a_z
+        pool_x[with_a] ^= b_x
+        pool_z[with_a] ^= b_z
+
+        logical_x.append(np.concatenate([a_x, a_z]))
+        logical_z.append(np.concatenate([b_x, b_z]))
+
+    return (np.array(logical_x, dtype=np.uint8).reshape(-1, 2 * num_qubits),
+            np.array(logical_z, dtype=np.uint8).reshape(-1, 2 * num_qubits))
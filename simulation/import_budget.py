@@ -0,0 +1,89 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Cumulative import time allowed for each entry point, in milliseconds.
+# Heavy dependencies (qiskit, stimbposd, matplotlib, requests, bs4) are only
+# imported by the code paths that use them and must stay out of these numbers.
+IMPORT_BUDGETS_MS = {
+    "loop": 400,
+}
+LAZY_PACKAGES = ("qiskit", "stimbposd", "matplotlib", "requests", "bs4")
+
+
+def measure_imports(module, path=None):
+    """
+    Imports module in a fresh interpreter with -X importtime and returns
+    {module name: (self ms, cumulative ms)} for every module it loaded.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=path or os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+    return timings
+
+
+def eager_imports(timings):
+    """Returns the LAZY_PACKAGES that were loaded in a measure_imports run."""
+    return sorted({name.split(".")[0] for name in timings} & set(LAZY_PACKAGES))
+
+
+def fastest_run(module, path=None, repeat=3):
+    """Measures module repeat times and returns the run with the lowest total."""
+    # The fastest run filters out disk cache and scheduling noise
+    runs = [measure_imports(module, path) for _ in range(max(1, repeat))]
+    return min(runs, key=lambda timing: timing.get(module, (0.0, 0.0))[1])
+
+
+def report(module, timings, top=15):
+    """Prints the total and the top-level packages that cost the most, by self time."""
+    packages = {}
+    for name, (self_ms, _) in timings.items():
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + self_ms
+    total = timings.get(module, (0.0, 0.0))[1]
+    print(f"import {module}: {total:.1f} ms")
+    for package, self_ms in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<30} {self_ms:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import times and check them against IMPORT_BUDGETS_MS.")
+    parser.add_argument("modules", nargs="*", help="modules to measure (default: every budgeted module)")
+    parser.add_argument("--path", default=None, help="directory to import from (default: this directory)")
+    parser.add_argument("--budget-ms", type=float, default=None, help="override the budget for every module")
+    parser.add_argument("--repeat", type=int, default=3, help="measurements per module; the fastest counts")
+    parser.add_argument("--top", type=int, default=15, help="packages listed in the report")
+    args = parser.parse_args()
+
+    over_budget = []
+    for module in args.modules or list(IMPORT_BUDGETS_MS):
+        timings = fastest_run(module, args.path, args.repeat)
+        report(module, timings, args.top)
+        budget = args.budget_ms if args.budget_ms is not None else IMPORT_BUDGETS_MS.get(module)
+        total = timings.get(module, (0.0, 0.0))[1]
+        if budget is not None and total > budget:
+            over_budget.append(f"{module} ({total:.1f} ms > {budget:.0f} ms)")
+        eager = eager_imports(timings)
+        if eager:
+            over_budget.append(f"{module} (imports {', '.join(eager)} eagerly)")
+
+    if over_budget:
+        print("Over import budget: " + ", ".join(over_budget))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,81 +1,301 @@
 import numpy as np
-from error_Calculation import convert_to_stabilizers, generate_stim_circuit, simulate_stim_circuit, decode_outputs, calculate_error_rate
-from gate_balancing import generate_qiskit_circuit, advanced_gate_balancing, qiskit_to_stim
-from swap_gate_minimization import main as swap_gate_minimization
-from qiskit import QuantumCircuit
+import functools
+import inspect
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from error_Calculation import convert_to_stabilizers, get_compiled_artifacts, simulate_stim_circuit, decode_outputs, calculate_error_rate, estimate_logical_error_rate
+from stabilizer_matrix import StabilizerMatrix
+from timing import timed, timing_info, pop_timings, merge_timings, clear_timings
 
+# Results of pure pipeline stages, keyed by (stage, matrix content hash, parameters).
+# Cached matrices are shared between callers and must not be modified in place.
+STAGE_CACHE_SIZE = 256
+_stage_cache = OrderedDict()
+_stage_cache_stats = {"hits": 0, "misses": 0}
+
+def _stage_cache_get(key):
+    result = _stage_cache.get(key)
+    if result is None:
+        _stage_cache_stats["misses"] += 1
+        return None
+    _stage_cache_stats["hits"] += 1
+    _stage_cache.move_to_end(key)
+    return result
+
+def _stage_cache_put(key, result, replace=True):
+    if not replace and key in _stage_cache:
+        return
+    _stage_cache[key] = result
+    while len(_stage_cache) > STAGE_CACHE_SIZE:
+        _stage_cache.popitem(last=False)
+
+def stage_cache_key(name, x_part, z_part, *params):
+    return (name, StabilizerMatrix.from_parts(x_part, z_part).content_hash(), params)
+
+def memoize_stage(stage):
+    """Caches a stage that is a pure function of (x_part, z_part, *params) in the stage LRU."""
+    signature = inspect.signature(stage)
+
+    def bind(x_part, z_part, *args, **kwargs):
+        # Bind against the signature so positional, keyword and default arguments share a key
+        bound = signature.bind(x_part, z_part, *args, **kwargs)
+        bound.apply_defaults()
+        params = tuple(bound.arguments.values())[2:]
+        return bound, stage_cache_key(stage.__name__, x_part, z_part, *params)
+
+    @functools.wraps(stage)
+    def wrapper(x_part, z_part, *args, **kwargs):
+        bound, key = bind(x_part, z_part, *args, **kwargs)
+        result = _stage_cache_get(key)
+        if result is None:
+            result = stage(*bound.args, **bound.kwargs)
+            _stage_cache_put(key, result)
+        return result
+
+    def remember(result, x_part, z_part, *args, **kwargs):
+        """Stores a result computed elsewhere (e.g. in a worker process) under the call's key, keeping one already cached."""
+        _stage_cache_put(bind(x_part, z_part, *args, **kwargs)[1], result, replace=False)
+
+    wrapper.remember = remember
+    return wrapper
+
+def stage_cache_info():
+    return {**_stage_cache_stats, "size": len(_stage_cache), "max_size": STAGE_CACHE_SIZE}
+
+def clear_stage_cache():
+    _stage_cache.clear()
+    _stage_cache_stats.update(hits=0, misses=0)
+
+@memoize_stage
+@timed("gate_balancing")
 def run_gate_balancing(x_part, z_part):
+    # qiskit is imported with the transpiler stages, on first use
+    from gate_balancing import generate_qiskit_circuit, advanced_gate_balancing
+
     qc = generate_qiskit_circuit(x_part, z_part)
     balanced_qc = advanced_gate_balancing(qc)
     return circuit_to_matrices(balanced_qc)
 
+@memoize_stage
+@timed("swap_gate_minimization")
 def run_swap_gate_minimization(x_part, z_part):
+    from swap_gate_minimization import main as swap_gate_minimization
+
     # qc = generate_qiskit_circuit(x_part, z_part)
     optimized_qc = swap_gate_minimization(x_part, z_part)
     return circuit_to_matrices(optimized_qc)
 
-def calculate_error_rate_for_matrices(x_part, z_part):
+@memoize_stage
+@timed("error_rate")
+def calculate_error_rate_for_matrices(x_part, z_part, num_shots=100, num_workers=1, seed=None):
     stabilizers = convert_to_stabilizers(x_part, z_part)
     p = 0.07
     num_rounds = 10
-    num_shots = 100
     
-    circuit = generate_stim_circuit(stabilizers, p, num_rounds)
-    detector_samples, observables = simulate_stim_circuit(circuit, num_shots)
-    predicted_observables = decode_outputs(circuit, detector_samples)
+    artifacts = get_compiled_artifacts(stabilizers, p, num_rounds)
+    circuit = artifacts["circuit"]
+    sampler = artifacts["sampler"] if seed is None else None
+    detector_samples, observables = simulate_stim_circuit(circuit, num_shots, num_workers=num_workers, seed=seed, sampler=sampler)
+    predicted_observables = decode_outputs(circuit, detector_samples, decoder=artifacts["decoder"])
     error_rate, num_mistakes = calculate_error_rate(predicted_observables, observables)
     
     return error_rate
 
-def run_workflow(x_part, z_part, num_iterations=2):
+@memoize_stage
+@timed("error_rate")
+def estimate_error_rate_for_matrices(x_part, z_part, target_relative_error=0.1, min_errors=100, max_shots=10_000, num_workers=1, seed=None):
+    """
+    Adaptive counterpart of calculate_error_rate_for_matrices returning (error_rate, (low, high), num_shots).
+
+    Without a seed the estimate is seeded from the matrix content hash, so the
+    same matrices score the same in every process and candidates holding equal
+    matrices cannot win over each other on sampling noise.
+    """
+    if seed is None:
+        seed = int(StabilizerMatrix.from_parts(x_part, z_part).content_hash()[:16], 16)
+    stabilizers = convert_to_stabilizers(x_part, z_part)
+    p = 0.07
+    num_rounds = 10
+
+    artifacts = get_compiled_artifacts(stabilizers, p, num_rounds)
+    return estimate_logical_error_rate(
+        artifacts["circuit"],
+        target_relative_error=target_relative_error,
+        min_errors=min_errors,
+        max_shots=max_shots,
+        num_workers=num_workers,
+        seed=seed,
+        decoder=artifacts["decoder"]
+    )
+
+def check_candidate(x_part, z_part):
+    """Pre-flight check run before circuit generation; returns the reason a candidate is invalid, or None."""
+    try:
+        StabilizerMatrix.from_parts(x_part, z_part).validate()
+    except ValueError as e:
+        return str(e)
+    return None
+
+def evaluate_candidate(x_part, z_part):
+    """Estimates the error rate of a candidate, scoring rejected candidates as inf."""
+    reason = check_candidate(x_part, z_part)
+    if reason is None:
+        try:
+            return estimate_error_rate_for_matrices(x_part, z_part)
+        except ValueError as e:
+            # stim rejects circuits whose detectors or observables are not deterministic
+            reason = str(e).splitlines()[0]
+    print(f"Rejected candidate: {reason}")
+    return float('inf'), (0.0, 1.0), 0
+
+def run_candidate(stage, x_part, z_part, *stage_args):
+    """Runs one optimization stage and scores its output; the unit of work run_workflow hands to its pool."""
+    candidate_x_part, candidate_z_part = stage(x_part, z_part, *stage_args)
+    error_rate, interval, shots = evaluate_candidate(candidate_x_part, candidate_z_part)
+    return candidate_x_part, candidate_z_part, error_rate, interval, shots
+
+def _run_candidate_in_worker(stage, x_part, z_part, *stage_args):
+    # Stage timings recorded in a worker process are handed back with the result
+    return run_candidate(stage, x_part, z_part, *stage_args), pop_timings()
+
+def evaluate_candidates(stages, x_part, z_part, executor=None):
+    """
+    Runs run_candidate for every (stage, stage_args) pair and returns the
+    results in the order of stages.
+
+    The stages share no state, so with an executor they are submitted
+    together and collected as they finish. Finished candidates are kept in
+    the stage cache of this process, so workers are only sent misses.
+    """
+    keys = [
+        stage_cache_key("candidate:" + stage.__name__, x_part, z_part, *stage_args)
+        for stage, stage_args in stages
+    ]
+    results = [_stage_cache_get(key) for key in keys]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if executor is None:
+        for i in missing:
+            stage, stage_args = stages[i]
+            results[i] = run_candidate(stage, x_part, z_part, *stage_args)
+    else:
+        futures = {
+            executor.submit(_run_candidate_in_worker, stages[i][0], x_part, z_part, *stages[i][1]): i
+            for i in missing
+        }
+        for future in as_completed(futures):
+            results[futures[future]], timings = future.result()
+            merge_timings(timings)
+        # Workers scored the candidates in their own caches; keep the estimates
+        # here too, so rescoring the same matrices in this process draws no shots
+        for i in missing:
+            candidate_x_part, candidate_z_part, error_rate, interval, shots = results[i]
+            if shots > 0:
+                estimate_error_rate_for_matrices.remember((error_rate, interval, shots), candidate_x_part, candidate_z_part)
+    for i in missing:
+        _stage_cache_put(keys[i], results[i])
+    return results
+
+def run_workflow(x_part, z_part, num_iterations=2, num_workers=1, stop_on_repeat=False, on_iteration=None):
     global_minimum_error = float('inf')
     best_x_part = None
     best_z_part = None
 
-    for i in range(num_iterations):
-        print(f"\nIteration {i+1}:")
+    # Reject an invalid input before it reaches the transpiler or stim
+    StabilizerMatrix.from_parts(x_part, z_part).validate()
+
+    # Candidate evaluations run in a pool kept for the whole workflow, so each
+    # worker's compiled-circuit cache stays warm across iterations. Forked workers
+    # start with a copy of this process's timings, which must not be reported twice
+    executor = ProcessPoolExecutor(max_workers=num_workers, initializer=clear_timings) if num_workers > 1 else None
+    seen_matrices = {StabilizerMatrix.from_parts(x_part, z_part)}
+    try:
+        for i in range(num_iterations):
+            print(f"\nIteration {i+1}:")
         
-        # Run gate balancing
-        gb_x_part, gb_z_part = run_gate_balancing(x_part, z_part)
-        gb_error_rate = calculate_error_rate_for_matrices(gb_x_part, gb_z_part)
-        print(f"Gate balancing error rate: {gb_error_rate:.4f}")
-
-        # Run swap gate minimization
-        sgm_x_part, sgm_z_part = run_swap_gate_minimization(x_part, z_part)
-        sgm_error_rate = calculate_error_rate_for_matrices(sgm_x_part, sgm_z_part)
-        print(f"Swap gate minimization error rate: {sgm_error_rate:.4f}")
-
-        # Compare error rates and update if necessary
-        if gb_error_rate < sgm_error_rate:
-            current_error_rate = gb_error_rate
-            current_x_part = gb_x_part
-            current_z_part = gb_z_part
-            print("Gate balancing performed better")
-        else:
-            current_error_rate = sgm_error_rate
-            current_x_part = sgm_x_part
-            current_z_part = sgm_z_part
-            print("Swap gate minimization performed better")
-
-        if current_error_rate < global_minimum_error:
-            global_minimum_error = current_error_rate
-            best_x_part = current_x_part.copy()
-            best_z_part = current_z_part.copy()
-            print(f"New minimum error rate: {global_minimum_error:.4f}")
-        else:
-            print(f"Current minimum error rate: {global_minimum_error:.4f}")
-
-        # Use the better matrices for the next iteration
-        x_part = current_x_part
-        z_part = current_z_part
+            # Run gate balancing and swap gate minimization, in parallel when a pool is available
+            gb_result, sgm_result = evaluate_candidates(
+                [(run_gate_balancing, ()), (run_swap_gate_minimization, ())], x_part, z_part, executor
+            )
+            gb_x_part, gb_z_part, gb_error_rate, gb_interval, gb_shots = gb_result
+            sgm_x_part, sgm_z_part, sgm_error_rate, sgm_interval, sgm_shots = sgm_result
+            print(f"Gate balancing error rate: {gb_error_rate:.4f} (95% CI {gb_interval[0]:.4f}-{gb_interval[1]:.4f}, {gb_shots} shots)")
+            print(f"Swap gate minimization error rate: {sgm_error_rate:.4f} (95% CI {sgm_interval[0]:.4f}-{sgm_interval[1]:.4f}, {sgm_shots} shots)")
+
+            # Compare error rates and update if necessary
+            if gb_error_rate == sgm_error_rate == float('inf'):
+                # Both candidates were rejected, so stay on the current matrices
+                current_error_rate = float('inf')
+                current_interval = (0.0, 1.0)
+                current_x_part = x_part
+                current_z_part = z_part
+                strategy = None
+                print("Both candidates rejected, keeping current matrices")
+            elif gb_error_rate < sgm_error_rate:
+                current_error_rate = gb_error_rate
+                current_interval = gb_interval
+                current_x_part = gb_x_part
+                current_z_part = gb_z_part
+                strategy = "gate_balancing"
+                print("Gate balancing performed better")
+            else:
+                current_error_rate = sgm_error_rate
+                current_interval = sgm_interval
+                current_x_part = sgm_x_part
+                current_z_part = sgm_z_part
+                strategy = "swap_gate_minimization"
+                print("Swap gate minimization performed better")
+
+            if current_error_rate < global_minimum_error:
+                global_minimum_error = current_error_rate
+                best_x_part = current_x_part.copy()
+                best_z_part = current_z_part.copy()
+                print(f"New minimum error rate: {global_minimum_error:.4f}")
+            else:
+                print(f"Current minimum error rate: {global_minimum_error:.4f}")
+
+            # Progress hook for callers that report partial results; returning False
+            # stops the workflow after this iteration
+            if on_iteration is not None:
+                keep_going = on_iteration({
+                    "iteration": i + 1,
+                    "gate_balancing": {"error_rate": gb_error_rate, "interval": gb_interval, "shots": gb_shots},
+                    "swap_gate_minimization": {"error_rate": sgm_error_rate, "interval": sgm_interval, "shots": sgm_shots},
+                    "strategy": strategy,
+                    "error_rate": current_error_rate,
+                    "interval": current_interval,
+                    "minimum_error_rate": global_minimum_error,
+                    "best_x_part": best_x_part,
+                    "best_z_part": best_z_part,
+                })
+                if keep_going is False:
+                    print(f"Stopped by caller after iteration {i+1}")
+                    break
+
+            # Use the better matrices for the next iteration
+            x_part = current_x_part
+            z_part = current_z_part
+
+            # Stages are memoized, so a matrix pair seen before would only replay earlier iterations
+            if stop_on_repeat:
+                matrix = StabilizerMatrix.from_parts(x_part, z_part)
+                if matrix in seen_matrices:
+                    print(f"Matrices repeated after iteration {i+1}, stopping early")
+                    break
+                seen_matrices.add(matrix)
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
     print(f"\nFinal minimum error rate: {global_minimum_error:.4f}")
     print("Best x_part:")
     print(best_x_part)
     print("Best z_part:")
     print(best_z_part)
+    print("Stage timings:")
+    for name, timing in timing_info().items():
+        print(f"  {name}: {timing['calls']} calls, {timing['total_ms']:.1f} ms")
 
-def circuit_to_matrices(qc: QuantumCircuit):
+def circuit_to_matrices(qc: 'QuantumCircuit'):
     num_rows = qc.num_qubits // 2
     num_cols = qc.num_qubits - num_rows
     x_part = np.zeros((num_rows, num_cols), dtype=int)
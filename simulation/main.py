@@ -1,10 +1,32 @@
+import sys
 import stim
-circuit = stim.Circuit()
 
-# First, the circuit will initialize a Bell pair.
-circuit.append("H", [0])
-circuit.append("CNOT", [0, 1])
 
-# Then, the circuit will measure both qubits of the Bell pair in the Z basis.
-circuit.append("M", [0, 1])
-circuit.diagram()
\ No newline at end of file
+def bell_pair_circuit():
+    circuit = stim.Circuit()
+
+    # First, the circuit will initialize a Bell pair.
+    circuit.append("H", [0])
+    circuit.append("CNOT", [0, 1])
+
+    # Then, the circuit will measure both qubits of the Bell pair in the Z basis.
+    circuit.append("M", [0, 1])
+    return circuit
+
+
+def run_simulation(model, error_rate, distances):
+    """
+    Entry point shared by the command line and simulation/worker.py.
+
+    Returns the text diagram of the simulated circuit. model, error_rate and
+    distances are accepted for the backend API but not used by the Bell-pair
+    circuit yet.
+    """
+    circuit = bell_pair_circuit()
+    return str(circuit.diagram())
+
+
+if __name__ == "__main__":
+    # python main.py <MODEL> <ERROR_RATE> <DISTANCES>
+    model, error_rate, distances = (sys.argv[1:] + [None, None, ""])[:3]
+    print(run_simulation(model, error_rate, distances.split(",") if distances else []))
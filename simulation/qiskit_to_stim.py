@@ -1,9 +1,9 @@
 from qiskit import QuantumCircuit
 import matplotlib.pyplot as plt
 import stim
-import random
 from bposd import bposd_decoder
 import numpy as np
+from stim_conversion import qiskit_to_stim_circuit
 
 def decode_noisy_samples(result, x_part, z_part):
     num_shots, num_qubits = result.shape
@@ -29,17 +29,6 @@ def decode_noisy_samples(result, x_part, z_part):
 
 
 
-
-# Dictionary to map Qiskit gates to Stim gates
-gate_mapping = {
-    'h': 'H',       # Hadamard
-    'x': 'X',       # Pauli-X
-    'z': 'Z',       # Pauli-Z
-    'cx': 'CNOT',   # CNOT
-    'cz': 'CZ',     # CZ
-    'measure': 'M'  # Measurement
-}
-
 # def generate_qiskit_circuit(x_part, z_part):
 #     """
 #     Generates a Qiskit QuantumCircuit based on the input X and Z stabilizer matrices
@@ -129,50 +118,24 @@ def visualize_qiskit_circuit(qc):
 
 def qiskit_to_stim(qc, depol1_prob=0.01, depol2_prob=0.02):
     """
-    Converts a Qiskit QuantumCircuit into a stim circuit string with depolarizing noise.
-    
+    Converts a Qiskit QuantumCircuit into a stim circuit with depolarizing noise.
+
     Args:
     - qc (QuantumCircuit): The Qiskit circuit.
     - depol1_prob (float): Probability for depolarizing noise on 1-qubit gates.
     - depol2_prob (float): Probability for depolarizing noise on 2-qubit gates.
-    
+
     Returns:
-    - str: A string representation of the stim circuit with depolarizing noise added.
+    - stim.Circuit: The circuit, with runs of same-type gates grouped into one instruction.
     """
-    stim_circuit = []
-    
-    # Iterate over the instructions in the Qiskit circuit
-    for instruction in qc.data:
-        gate = instruction.operation.name  # Gate name
-        qubits = instruction.qubits        # Qubits the gate acts on
-        
-        # Get the corresponding stim gate from the mapping
-        stim_gate = gate_mapping.get(gate.lower(), None)
-        
-        if stim_gate:
-            # Extract the qubit indices
-            qubit_indices = [q._index for q in qubits]  # Use _index attribute
-
-            # Build the stim gate string and add to the circuit
-            if len(qubit_indices) == 1:
-                stim_circuit.append(f"{stim_gate} {qubit_indices[0]}")
-                # Add DEPOL1 for single-qubit gate (H)
-                if stim_gate == 'H':
-                    stim_circuit.append(f"DEPOLARIZE1({depol1_prob}) {qubit_indices[0]}")
-            elif len(qubit_indices) == 2:
-                stim_circuit.append(f"{stim_gate} {qubit_indices[0]} {qubit_indices[1]}")
-                # Add DEPOL2 for two-qubit gates (CX, CZ, CY)
-                if stim_gate in ['CNOT', 'CZ', 'CY']:
-                    stim_circuit.append(f"DEPOLARIZE2({depol2_prob}) {qubit_indices[0]} {qubit_indices[1]}")
-    
-    return "\n".join(stim_circuit)
+    return qiskit_to_stim_circuit(qc, depol1_prob=depol1_prob, depol2_prob=depol2_prob)
 
 def run_stim_simulation(string_circuit):
     """
     Runs a simulation on the given stim circuit string and shows results both before and after applying noise.
     """
     # Create a STIM circuit from the input string
-    circuit = stim.Circuit(stim_circuit_string)
+    circuit = string_circuit if isinstance(string_circuit, stim.Circuit) else stim.Circuit(string_circuit)
     
     # Run the circuit and sample 'num_shots' times
     num_shots = 100
@@ -207,14 +170,14 @@ if __name__ == "__main__":
     # Visualize the Qiskit circuit
     # visualize_qiskit_circuit(qc)
     
-    # Convert the Qiskit circuit to a Stim circuit string with depolarizing noise
-    stim_circuit_string = qiskit_to_stim(qc, depol1_prob=0.01, depol2_prob=0.02)
+    # Convert the Qiskit circuit to a Stim circuit with depolarizing noise
+    stim_circuit = qiskit_to_stim(qc, depol1_prob=0.01, depol2_prob=0.02)
     
     # Output the Stim circuit
-    print("Stim Circuit:\n", stim_circuit_string)
+    print("Stim Circuit:\n", stim_circuit)
     
     # Run the simulation and get noisy samples
-    noisy_samples = run_stim_simulation(stim_circuit_string)
+    noisy_samples = run_stim_simulation(stim_circuit)
     print("Samples: \n", noisy_samples, '\n')
     
     decode_noisy_samples(noisy_samples, x_part, z_part)
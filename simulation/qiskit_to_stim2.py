@@ -1,9 +1,9 @@
 from qiskit import QuantumCircuit
 import matplotlib.pyplot as plt
 import stim
-import random
 from bposd import bposd_decoder
 import numpy as np
+from stim_conversion import qiskit_to_stim_circuit
 
 
 def calculate_syndrome(noisy_sample, stabilizer_matrix):
@@ -57,17 +57,6 @@ def decode_noisy_samples_bposd(noisy_samples, x_part, z_part):
     return corrected_samples
 
 
-# Dictionary to map Qiskit gates to Stim gates
-gate_mapping = {
-    'h': 'H',  # Hadamard
-    'x': 'X',  # Pauli-X
-    'z': 'Z',  # Pauli-Z
-    'cx': 'CNOT',  # CNOT
-    'cz': 'CZ',  # CZ
-    'measure': 'M'  # Measurement
-}
-
-
 def generate_qiskit_circuit(x_part, z_part):
     """
     Generates a Qiskit QuantumCircuit based on the input X and Z stabilizer matrices
@@ -125,7 +114,7 @@ def visualize_qiskit_circuit(qc):
 
 def qiskit_to_stim(qc, depol1_prob=0.01, depol2_prob=0.02):
     """
-    Converts a Qiskit QuantumCircuit into a stim circuit string with depolarizing noise.
+    Converts a Qiskit QuantumCircuit into a stim circuit with depolarizing noise.
 
     Args:
     - qc (QuantumCircuit): The Qiskit circuit.
@@ -133,100 +122,45 @@ def qiskit_to_stim(qc, depol1_prob=0.01, depol2_prob=0.02):
     - depol2_prob (float): Probability for depolarizing noise on 2-qubit gates.
 
     Returns:
-    - str: A string representation of the stim circuit with depolarizing noise added.
+    - stim.Circuit: The circuit, with runs of same-type gates grouped into one instruction.
     """
-    stim_circuit = []
-
-    # Iterate over the instructions in the Qiskit circuit
-    for instruction in qc.data:
-        gate = instruction.operation.name  # Gate name
-        qubits = instruction.qubits  # Qubits the gate acts on
-
-        # Get the corresponding stim gate from the mapping
-        stim_gate = gate_mapping.get(gate.lower(), None)
-
-        if stim_gate:
-            # Extract the qubit indices
-            qubit_indices = [q._index for q in qubits]  # Use _index attribute
+    return qiskit_to_stim_circuit(qc, depol1_prob=depol1_prob, depol2_prob=depol2_prob)
 
-            # Debugging output: print the gate and qubits being added
-            print(f"Adding Stim Gate: {stim_gate}, Qubits: {qubit_indices}")
 
-            # Build the stim gate string and add to the circuit
-            if len(qubit_indices) == 1:
-                stim_circuit.append(f"{stim_gate} {qubit_indices[0]}")
-                # Add DEPOL1 for single-qubit gate (H)
-                if stim_gate == 'H':
-                    stim_circuit.append(f"DEPOLARIZE1({depol1_prob}) {qubit_indices[0]}")
-            elif len(qubit_indices) == 2:
-                stim_circuit.append(f"{stim_gate} {qubit_indices[0]} {qubit_indices[1]}")
-                # Add DEPOL2 for two-qubit gates (CX, CZ, CY)
-                if stim_gate in ['CNOT', 'CZ', 'CY']:
-                    stim_circuit.append(f"DEPOLARIZE2({depol2_prob}) {qubit_indices[0]} {qubit_indices[1]}")
 
-    return "\n".join(stim_circuit)
-
-
-
-def run_stim_simulation(string_circuit, apply_noise=True):
-    """
-    Runs a simulation on the given stim circuit string and shows results both before and after applying noise.
+def run_stim_simulation(string_circuit, apply_noise=True, num_shots=1, readout_error=0.0, seed=None):
     """
-    # Create the stim circuit from the provided string
-    circuit = stim.Circuit(string_circuit)
+    Samples the circuit with and without its noise channels and measures every qubit at the end.
 
-    # Create a TableauSimulator for simulating the circuit
-    simulator_clean = stim.TableauSimulator()  # For clean simulation
-    simulator_noisy = stim.TableauSimulator()  # For noisy simulation
-
-    # Initialize both simulators with the circuit
-    simulator_clean.do(circuit)
-    simulator_noisy.do(circuit)
+    Args:
+    - string_circuit (str or stim.Circuit): The circuit, e.g. from qiskit_to_stim.
+    - apply_noise (bool): Whether to also draw samples with the noise channels kept.
+    - num_shots (int): Number of independent shots.
+    - readout_error (float): Flip probability of each final measurement, applied through M(p).
+    - seed (int): Seed for the samplers.
 
-    # Determine the number of qubits in the circuit
-    num_qubits = circuit.num_qubits  # Use stim's built-in method to get the number of qubits
-    print(f"Number of qubits in the circuit: {num_qubits}")
+    Returns:
+    - (clean_samples, noisy_samples): (num_shots, num_qubits) uint8 arrays; noisy_samples
+      is the clean array when apply_noise is False.
+    """
+    circuit = string_circuit if isinstance(string_circuit, stim.Circuit) else stim.Circuit(string_circuit)
 
     # Ensure the number of qubits matches the stabilizer matrix dimensions
+    num_qubits = circuit.num_qubits
     if num_qubits != 10:
         raise ValueError(f"Expected 10 qubits, but got {num_qubits}. Check the circuit generation.")
 
-    # Set the number of shots (samples)
-    num_shots = 1  # Run 100 shots for statistical results
-
-    # 1. Run the clean simulation (before noise is applied)
-    clean_samples = []
-    for _ in range(num_shots):
-        single_sample_clean = []
-        for qubit in range(num_qubits):
-            # Measure each qubit individually (clean simulation)
-            measurement_clean = simulator_clean.measure(qubit)
-            single_sample_clean.append(measurement_clean)
-        clean_samples.append(single_sample_clean)
-
-    # Print the clean samples
-    print("\nClean Samples (Before Noise):")
-    for sample in clean_samples:
-        print(sample)
-
-    # 2. If apply_noise is True, run the noisy simulation (after noise is applied)
-    if apply_noise:
-        noisy_samples = []
-        for _ in range(num_shots):
-            single_sample_noisy = []
-            for qubit in range(num_qubits):
-                # Measure each qubit individually (noisy simulation)
-                measurement_noisy = simulator_noisy.measure(qubit)
-                single_sample_noisy.append(measurement_noisy)
-            noisy_samples.append(single_sample_noisy)
-
-        # Print the noisy samples
-        print("\nNoisy Samples (After Noise):")
-        for sample in noisy_samples:
-            print(sample)
-
-    return clean_samples, noisy_samples if apply_noise else clean_samples
+    def sample(circuit):
+        # One compiled sampler draws every shot, bit-packed, in a single call
+        circuit = circuit.copy()
+        num_measurements = circuit.num_measurements + num_qubits
+        circuit.append("M", range(num_qubits), readout_error)
+        packed = circuit.compile_sampler(seed=seed).sample(num_shots, bit_packed=True)
+        return np.unpackbits(packed, axis=1, count=num_measurements, bitorder='little')[:, -num_qubits:]
 
+    clean_samples = sample(circuit.without_noise())
+    noisy_samples = sample(circuit) if apply_noise else clean_samples
+    return clean_samples, noisy_samples
 
 
 # Example usage
@@ -254,14 +188,16 @@ if __name__ == "__main__":
     # Visualize the Qiskit circuit
     visualize_qiskit_circuit(qc)
 
-    # Convert the Qiskit circuit to a Stim circuit string with depolarizing noise
-    stim_circuit_string = qiskit_to_stim(qc, depol1_prob=0.01, depol2_prob=0.02)
+    # Convert the Qiskit circuit to a Stim circuit with depolarizing noise
+    stim_circuit = qiskit_to_stim(qc, depol1_prob=0.01, depol2_prob=0.02)
 
     # Output the Stim circuit
-    print("Stim Circuit:\n", stim_circuit_string)
+    print("Stim Circuit:\n", stim_circuit)
 
     # Run the simulation and get noisy samples
-    _, noisy_samples = run_stim_simulation(stim_circuit_string)
+    clean_samples, noisy_samples = run_stim_simulation(stim_circuit)
+    print("\nClean Samples (Before Noise):\n", clean_samples)
+    print("\nNoisy Samples (After Noise):\n", noisy_samples)
 
     # Decode noisy samples using BPOSD
     corrected_samples = decode_noisy_samples_bposd(noisy_samples, x_part, z_part)
@@ -0,0 +1,69 @@
+import stim
+
+# Qiskit gate name -> stim gate name. Instructions missing here (barrier, delay, ...) are skipped.
+stim_gates = {
+    'id': 'I',
+    'x': 'X',
+    'y': 'Y',
+    'z': 'Z',
+    'h': 'H',
+    's': 'S',
+    'sdg': 'S_DAG',
+    'sx': 'SQRT_X',
+    'sxdg': 'SQRT_X_DAG',
+    'cx': 'CX',
+    'cy': 'CY',
+    'cz': 'CZ',
+    'swap': 'SWAP',
+    'measure': 'M',
+    'reset': 'R'
+}
+two_qubit_gates = {'CX', 'CY', 'CZ', 'SWAP'}
+# Gates that are not followed by depolarizing noise
+noiseless_gates = {'I', 'M', 'R'}
+
+
+def qiskit_to_stim_circuit(qc, depol1_prob=0.0, depol2_prob=0.0, measure_flip_prob=0.0):
+    """
+    Converts a Qiskit QuantumCircuit straight into a stim.Circuit.
+
+    Consecutive gates of one type on disjoint qubits become a single stim
+    instruction, followed by one DEPOLARIZE1(depol1_prob) or
+    DEPOLARIZE2(depol2_prob) over the same targets when that probability is
+    non-zero. Measurements flip with probability measure_flip_prob through
+    M(p). Measurement results are recorded in the order of the Qiskit
+    measure instructions.
+    """
+    qubit_index = {bit: i for i, bit in enumerate(qc.qubits)}
+
+    # Runs of (stim gate, targets, qubits used by the run)
+    groups = []
+    for instruction in qc.data:
+        gate = stim_gates.get(instruction.operation.name)
+        if gate is None:
+            continue
+        targets = [qubit_index[bit] for bit in instruction.qubits]
+        if groups and groups[-1][0] == gate and groups[-1][2].isdisjoint(targets):
+            groups[-1][1].extend(targets)
+            groups[-1][2].update(targets)
+        else:
+            groups.append((gate, targets, set(targets)))
+
+    # stim.Circuit.append costs tens of microseconds per call while parsing
+    # costs well under one per instruction, so the grouped program is handed
+    # to stim in one piece
+    lines = []
+    for gate, targets, _ in groups:
+        line_targets = " ".join(map(str, targets))
+        if gate == 'M' and measure_flip_prob:
+            lines.append(f"M({measure_flip_prob}) {line_targets}")
+        else:
+            lines.append(f"{gate} {line_targets}")
+        if gate in noiseless_gates:
+            continue
+        if gate in two_qubit_gates:
+            if depol2_prob:
+                lines.append(f"DEPOLARIZE2({depol2_prob}) {line_targets}")
+        elif depol1_prob:
+            lines.append(f"DEPOLARIZE1({depol1_prob}) {line_targets}")
+    return stim.Circuit("\n".join(lines))
@@ -1,18 +1,47 @@
-from qiskit import QuantumCircuit, transpile
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import qiskit
+from qiskit import QuantumCircuit
 from qiskit.transpiler import CouplingMap
-import matplotlib.pyplot as plt
+from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
 import stim
-import random
-
-# Dictionary to map Qiskit gates to Stim gates
-gate_mapping = {
-    'h': 'H',
-    'x': 'X',
-    'z': 'Z',
-    'cx': 'CNOT',
-    'cz': 'CZ',
-    'measure': 'M'
-}
+import numpy as np
+from stabilizer_matrix import StabilizerMatrix
+from artifact_cache import artifact_key, load_transpiled, store_transpiled
+from timing import stage_timer
+from stim_conversion import qiskit_to_stim_circuit
+
+
+# Optimization levels tried for every circuit, and the layout seeds swept at each level
+OPTIMIZATION_LEVELS = (0, 1, 2, 3)
+TRANSPILE_SEEDS = tuple(int(seed) for seed in os.environ.get("TRANSPILE_SEEDS", "0").split(","))
+# Processes sharing the candidates of one circuit; 1 transpiles them in this
+# process, which is best when run_workflow already evaluates stages in a pool
+TRANSPILE_WORKERS = int(os.environ.get("TRANSPILE_WORKERS", 1))
+
+# Preset pass managers keyed by (coupling map edges, level, seed). Building one
+# costs about as much as running it on these small circuits. Running one writes
+# to its property set, so every thread (job) keeps its own.
+_pass_managers = threading.local()
+_transpile_executor = None  # (num_workers, ProcessPoolExecutor)
+_transpile_executor_lock = threading.Lock()
+
+# Transpiled circuits by transpile_cache_key, least recently used first. Misses
+# fall back to the shared artifact cache directory (see artifact_cache.py),
+# which server workers read and fill alike.
+TRANSPILE_CACHE_SIZE = int(os.environ.get("TRANSPILE_CACHE_SIZE", 256))
+TRANSPILE_DISK_CACHE = os.environ.get("TRANSPILE_DISK_CACHE", "1") != "0"
+_transpile_cache = OrderedDict()
+_transpile_cache_lock = threading.Lock()
+
+# Opt-in check that every transpiled candidate yields the same measurement
+# statistics as its input circuit. It costs about as much as transpiling, so it
+# is off unless SWAP_VALIDATION=1 or main(..., validate=True).
+SWAP_VALIDATION = os.environ.get("SWAP_VALIDATION", "0") == "1"
+VALIDATION_SHOTS = 1024
 
 def create_fully_connected_coupling_map(num_qubits):
     """Creates a fully connected coupling map for a given number of qubits."""
@@ -29,24 +58,25 @@ def compute_stabilizer_weight(matrix):
     return stabilizer_weights
 
 def generate_qiskit_circuit(x_part, z_part):
-    rows = len(x_part)
-    cols = len(x_part[0])
+    matrix = x_part if isinstance(x_part, StabilizerMatrix) else StabilizerMatrix.from_parts(x_part, z_part)
+    rows, cols = matrix.shape
     n_qubits = rows + cols
     n_classical_bits = rows
+    x_bits, z_bits = matrix.parts()
 
     qc = QuantumCircuit(n_qubits, n_classical_bits)
 
     for row in range(rows):
         qc.h(row)
 
-    for row in range(rows):
-        for col in range(cols):
-            row_qubit = row
-            col_qubit = rows + col
-            if x_part[row][col] == 1 and z_part[row][col] == 0:
-                qc.cx(row_qubit, col_qubit)
-            elif x_part[row][col] == 0 and z_part[row][col] == 1:
-                qc.cz(row_qubit, col_qubit)
+    # Only pure X and pure Z entries are mapped; Y entries get no gate here
+    for row, col in zip(*np.nonzero(x_bits ^ z_bits)):
+        row_qubit = int(row)
+        col_qubit = rows + int(col)
+        if x_bits[row, col]:
+            qc.cx(row_qubit, col_qubit)
+        else:
+            qc.cz(row_qubit, col_qubit)
 
     for row in range(rows):
         qc.h(row)
@@ -59,37 +89,171 @@ def generate_qiskit_circuit(x_part, z_part):
 def count_swap_gates(circuit):
     return sum(1 for gate in circuit.data if gate.operation.name == 'swap')
 
+def transpile_cost(circuit):
+    """Ranks transpiled candidates: depth first, then SWAP count, then gate count."""
+    return circuit.depth(), count_swap_gates(circuit), circuit.size()
+
+def get_pass_manager(coupling_map, level, seed=None):
+    """
+    Returns this thread's cached preset pass manager for an optimization level and layout seed.
+
+    coupling_map is a CouplingMap or its sorted tuple of edges.
+    """
+    edges = coupling_map if isinstance(coupling_map, tuple) else tuple(sorted(coupling_map.get_edges()))
+    key = (edges, level, seed)
+    pass_managers = getattr(_pass_managers, "by_key", None)
+    if pass_managers is None:
+        pass_managers = _pass_managers.by_key = {}
+    if key not in pass_managers:
+        pass_managers[key] = generate_preset_pass_manager(
+            level, coupling_map=CouplingMap(couplinglist=list(edges)), seed_transpiler=seed
+        )
+    return pass_managers[key]
+
+def transpile_cache_key(qc, edges, level, seed):
+    """Hash of the circuit's gate list, the coupling map edges, the level, the seed and the Qiskit version."""
+    qubit_index = {bit: i for i, bit in enumerate(qc.qubits)}
+    clbit_index = {bit: i for i, bit in enumerate(qc.clbits)}
+    gates = [
+        (
+            instruction.operation.name,
+            [qubit_index[bit] for bit in instruction.qubits],
+            [clbit_index[bit] for bit in instruction.clbits],
+            [str(param) for param in instruction.operation.params]
+        )
+        for instruction in qc.data
+    ]
+    return artifact_key("transpile", qiskit.__version__, qc.num_qubits, qc.num_clbits, gates, edges, level, seed)
+
+def _get_transpiled(key):
+    with _transpile_cache_lock:
+        circuit = _transpile_cache.get(key)
+        if circuit is not None:
+            _transpile_cache.move_to_end(key)
+    if circuit is None and TRANSPILE_DISK_CACHE:
+        circuit = load_transpiled(key)
+        if circuit is not None:
+            _put_transpiled(key, circuit, store=False)
+    # Callers may modify what they get back, the cached circuit must not change
+    return None if circuit is None else circuit.copy()
+
+def _put_transpiled(key, circuit, store=True):
+    with _transpile_cache_lock:
+        _transpile_cache[key] = circuit.copy()
+        while len(_transpile_cache) > TRANSPILE_CACHE_SIZE:
+            _transpile_cache.popitem(last=False)
+    if store and TRANSPILE_DISK_CACHE:
+        store_transpiled(key, circuit)
+
+def clear_transpile_cache():
+    with _transpile_cache_lock:
+        _transpile_cache.clear()
+
+def _transpile_candidate(qc, edges, level, seed):
+    # Runs in the worker processes too, each keeping its own pass manager cache
+    return level, seed, get_pass_manager(edges, level, seed).run(qc)
+
+def _get_transpile_executor(num_workers):
+    global _transpile_executor
+    with _transpile_executor_lock:
+        if _transpile_executor is None or _transpile_executor[0] != num_workers:
+            if _transpile_executor is not None:
+                _transpile_executor[1].shutdown(wait=False)
+            # Forked children can deadlock on the transpiler's native thread pool
+            context = multiprocessing.get_context("spawn")
+            _transpile_executor = (num_workers, ProcessPoolExecutor(max_workers=num_workers, mp_context=context))
+        return _transpile_executor[1]
+
+def transpile_candidates(qc, coupling_map, levels=OPTIMIZATION_LEVELS, seeds=TRANSPILE_SEEDS, num_workers=TRANSPILE_WORKERS):
+    """
+    Transpiles qc at every optimization level with every layout seed as one batch.
+
+    Returns [(level, seed, transpiled circuit)] in (level, seed) order.
+    Candidates found in the transpile cache are not transpiled again; with
+    num_workers > 1 the rest are spread over a process pool kept for reuse.
+    """
+    edges = tuple(sorted(coupling_map.get_edges()))
+    results = {}
+    misses = []
+    for level in levels:
+        for seed in seeds:
+            key = transpile_cache_key(qc, edges, level, seed)
+            circuit = _get_transpiled(key)
+            if circuit is None:
+                misses.append((key, level, seed))
+            else:
+                results[level, seed] = circuit
+
+    if num_workers <= 1 or len(misses) <= 1:
+        transpiled = [_transpile_candidate(qc, edges, level, seed) for _, level, seed in misses]
+    else:
+        executor = _get_transpile_executor(num_workers)
+        transpiled = executor.map(_transpile_candidate, *zip(*[(qc, edges, level, seed) for _, level, seed in misses]))
+    for (key, _, _), (level, seed, circuit) in zip(misses, transpiled):
+        _put_transpiled(key, circuit)
+        results[level, seed] = circuit
+
+    return [(level, seed, results[level, seed]) for level in levels for seed in seeds]
+
+def sample_clbits(qc, num_shots=VALIDATION_SHOTS):
+    """Samples the classical bits of qc with a compiled stim sampler; returns a (num_shots, num_clbits) bool array."""
+    clbit_index = {bit: i for i, bit in enumerate(qc.clbits)}
+    measured = [clbit_index[instruction.clbits[0]] for instruction in qc.data if instruction.operation.name == 'measure']
+    sampler = qiskit_to_stim(qc).compile_sampler()
+    bits = np.zeros((num_shots, qc.num_clbits), dtype=bool)
+    bits[:, measured] = sampler.sample(num_shots)
+    return bits
+
+def _parity_frequencies(bits):
+    # Frequency of b_i xor b_j for every pair of bits, with the frequency of b_i on the diagonal
+    ones = bits.astype(np.float64)
+    frequency = ones.mean(axis=0)
+    parity = frequency[:, None] + frequency[None, :] - 2 * (ones.T @ ones) / len(bits)
+    np.fill_diagonal(parity, frequency)
+    return parity
+
+def check_transpiled(reference_bits, optimized_qc, tolerance=5.0):
+    """
+    Compares the classical bits of a transpiled circuit with samples of its input circuit.
+
+    Single bits and pairwise parities that are deterministic in the reference
+    must match exactly; the frequency of the others must agree within
+    tolerance standard errors. Returns the indices of the bits that differ.
+    """
+    num_shots = len(reference_bits)
+    reference = _parity_frequencies(reference_bits)
+    candidate = _parity_frequencies(sample_clbits(optimized_qc, num_shots))
+    deterministic = (reference == 0) | (reference == 1)
+    # Standard error of the difference of two frequencies, at worst p = 1/2
+    standard_error = np.sqrt(0.5 / num_shots)
+    differs = np.where(deterministic, candidate != reference, np.abs(candidate - reference) > tolerance * standard_error)
+    return np.flatnonzero(differs.any(axis=0)).tolist()
+
 def qiskit_to_stim(qc):
-    stim_circuit = []
-    for instruction in qc.data:
-        gate = instruction.operation.name
-        qubits = instruction.qubits
-        stim_gate = gate_mapping.get(gate.lower(), None)
-        if stim_gate:
-            qubit_indices = [q._index for q in qubits]
-            if len(qubit_indices) == 1:
-                stim_circuit.append(f"{stim_gate} {qubit_indices[0]}")
-            elif len(qubit_indices) > 1:
-                stim_circuit.append(f"{stim_gate} {' '.join(map(str, qubit_indices))}")
-    return "\n".join(stim_circuit)
-
-def run_stim_simulation(string_circuit):
-    circuit = stim.Circuit(string_circuit)
-    simulator = stim.TableauSimulator()
-    simulator.do(circuit)
-
-    num_qubits = max(target.value for instruction in circuit for target in instruction.targets_copy() if target.is_qubit_target) + 1
-    num_shots = 100
-
-    samples = []
-    for _ in range(num_shots):
-        sample = [simulator.measure(qubit) for qubit in range(num_qubits)]
-        noisy_sample = [1 - bit if random.uniform(0, 1) < 0.01 else bit for bit in sample]
-        samples.append(noisy_sample)
-
-    # print(samples)
+    """Converts a Qiskit circuit into a stim.Circuit, one instruction per run of same-type gates."""
+    return qiskit_to_stim_circuit(qc)
+
+def run_stim_simulation(string_circuit, num_shots=100, readout_error=0.01, seed=None):
+    """
+    Runs the circuit num_shots times and measures every qubit at the end.
+
+    All shots come from one bit-packed call of a compiled sampler; readout
+    noise flips each final measurement with probability readout_error through
+    stim's M(p). Returns a (num_shots, num_qubits) uint8 array.
+    """
+    circuit = string_circuit.copy() if isinstance(string_circuit, stim.Circuit) else stim.Circuit(string_circuit)
+    num_qubits = circuit.num_qubits
+    num_measurements = circuit.num_measurements + num_qubits
+    circuit.append("M", range(num_qubits), readout_error)
+
+    packed = circuit.compile_sampler(seed=seed).sample(num_shots, bit_packed=True)
+    samples = np.unpackbits(packed, axis=1, count=num_measurements, bitorder='little')
+    return samples[:, -num_qubits:]
 
 def visualize_circuits(qc, optimized_qc):
+    # Optional dependency, only needed for plotting
+    import matplotlib.pyplot as plt
+
     fig, axs = plt.subplots(2, 1, figsize=(10, 12))
     qc.draw(output='mpl', ax=axs[0])
     axs[0].set_title("Original Circuit (Before Optimization)")
@@ -108,7 +272,7 @@ def main(x_part = [
         [1, 0, 0, 1, 1],
         [0, 0, 0, 0, 0],
         [0, 1, 1, 1, 1]
-    ]):
+    ], validate=None):
     # x_part = [
     #     [1, 0, 1, 0, 1],
     #     [0, 0, 1, 1, 0],
@@ -134,23 +298,23 @@ def main(x_part = [
     num_qubits = 9  # Adjust to match your circuit
     coupling_map = create_fully_connected_coupling_map(num_qubits)  # Fully connected map
     
+    validate = SWAP_VALIDATION if validate is None else validate
+    if validate:
+        # One reference sample of the input circuit serves every candidate
+        with stage_timer("swap_validation"):
+            reference_bits = sample_clbits(qc)
+
     best_optimized_qc = None
-    lowest_depth = float('inf')
+    lowest_cost = None
     
-    for level in range(4):
-        # print(f"\nRunning with optimization level {level}...")
-        optimized_qc = transpile(qc, coupling_map=coupling_map, optimization_level=level)
+    for level, seed, optimized_qc in transpile_candidates(qc, coupling_map):
+        # print(f"\nRunning with optimization level {level}, seed {seed}...")
 
         original_swap_count = count_swap_gates(qc)
         optimized_swap_count = count_swap_gates(optimized_qc)
 
         # visualize_circuits(qc, optimized_qc)
 
-        stim_circuit_string = qiskit_to_stim(optimized_qc)
-        # print("Stim Circuit:\n", stim_circuit_string)
-
-        run_stim_simulation(stim_circuit_string)
-
         original_depth = qc.depth()
         optimized_depth = optimized_qc.depth()
 
@@ -159,13 +323,23 @@ def main(x_part = [
         # print(f"Qubit Usage: {qubit_usage}")
         # print(f"Stabilizer Weights: {stabilizer_weights}")
 
-        if optimized_depth < lowest_depth:
-            lowest_depth = optimized_depth
+        if validate:
+            with stage_timer("swap_validation"):
+                differing_bits = check_transpiled(reference_bits, optimized_qc)
+            if differing_bits:
+                print(f"Skipping level {level}, seed {seed}: classical bits {differing_bits} differ from the input circuit")
+                continue
+
+        cost = transpile_cost(optimized_qc)
+        if lowest_cost is None or cost < lowest_cost:
+            lowest_cost = cost
             best_optimized_qc = optimized_qc
 
+    if best_optimized_qc is None:
+        raise ValueError("No transpiled circuit passed validation")
     # print("\nMost optimized circuit:")
     # print(f"Optimization level: {best_optimized_qc.metadata['optimization_level']}")
-    # print(f"Circuit depth: {lowest_depth}")
+    # print(f"Circuit depth: {lowest_cost[0]}")
     # best_optimized_qc.draw(output='mpl')
     # plt.show()
 
@@ -0,0 +1,13 @@
+import pytest
+import import_budget
+
+
+@pytest.mark.parametrize("module", sorted(import_budget.IMPORT_BUDGETS_MS))
+def test_heavy_dependencies_are_imported_lazily(module):
+    assert import_budget.eager_imports(import_budget.measure_imports(module)) == []
+
+
+@pytest.mark.parametrize("module", sorted(import_budget.IMPORT_BUDGETS_MS))
+def test_import_time_is_within_budget(module):
+    total = import_budget.fastest_run(module)[module][1]
+    assert total <= import_budget.IMPORT_BUDGETS_MS[module], f"import {module} took {total:.1f} ms"
@@ -0,0 +1,72 @@
+import json
+import struct
+import sys
+import traceback
+
+# Imported once per worker instead of once per request
+from main import run_simulation
+
+# Every message is a 4-byte big-endian length followed by that many bytes of UTF-8 JSON.
+HEADER = struct.Struct(">I")
+
+
+def read_message(stream):
+    """Returns the next decoded message, or None once the stream is closed."""
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    (length,) = HEADER.unpack(header)
+    body = stream.read(length)
+    if len(body) < length:
+        return None
+    return json.loads(body)
+
+
+def write_message(stream, message):
+    body = json.dumps(message).encode()
+    stream.write(HEADER.pack(len(body)) + body)
+    stream.flush()
+
+
+def simulate(params):
+    return run_simulation(params.get("model"), params.get("errorRate"), params.get("distances", []))
+
+
+HANDLERS = {
+    "ping": lambda params: "pong",
+    "simulate": simulate,
+}
+
+
+def serve(stdin, stdout):
+    """
+    Answers requests {"id", "method", "params"} with {"id", "result"} or {"id", "error"}.
+
+    Requests are handled one at a time in arrival order; the id lets the
+    caller match responses to requests it has pipelined.
+    """
+    while True:
+        request = read_message(stdin)
+        if request is None:
+            return
+        response = {"id": request.get("id")}
+        try:
+            handler = HANDLERS.get(request.get("method"))
+            if handler is None:
+                raise ValueError(f"Unknown method {request.get('method')!r}")
+            response["result"] = handler(request.get("params") or {})
+        except Exception as e:
+            traceback.print_exc()
+            response["error"] = str(e)
+        write_message(stdout, response)
+
+
+def main():
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    # stdout carries the protocol; stray prints from simulation code go to stderr
+    sys.stdout = sys.stderr
+    serve(stdin, stdout)
+
+
+if __name__ == "__main__":
+    main()